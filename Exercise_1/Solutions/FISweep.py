@@ -0,0 +1,84 @@
+"""
+Computational Neurodynamics
+Exercise 1
+
+F-I curves and a map of the firing regimes of Izhikevich neurons, and the
+F-I curve of the Hodgkin-Huxley neuron, each worked out in a single
+vectorised run of NeuronSweep.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from NeuronSweep import IzhikevichSweep, HodgkinHuxleySweep
+
+## Parameters of the regular spiking, fast spiking and bursting neurons of
+## IzNeuronRK4.py, one column each
+names = ['Regular spiking', 'Fast spiking', 'Bursting']
+a = np.array([0.02, 0.02, 0.02])
+b = np.array([0.2, 0.25, 0.2])
+c = np.array([-65.0, -65.0, -50.0])
+d = np.array([8.0, 2.0, 2.0])
+
+# Input currents, one row each
+I = np.linspace(0, 20, 201)
+
+## F-I curves of the three cell types: 603 neurons in one run
+start = time.time()
+iz = IzhikevichSweep(I[:, None], a, b, c, d, Tmax=1000, transient=200)
+print 'Izhikevich F-I curves: %d neurons in %.1f s' % (iz['rate'].size,
+                                                      time.time() - start)
+
+## Firing regimes over the reset parameters c and d at I = 10. Bursting
+## neurons fire groups of spikes separated by long pauses, so the
+## coefficient of variation of their ISIs is high, while tonic firing gives
+## a CV near 0.
+cs = np.linspace(-70, -40, 61)
+ds = np.linspace(0, 10, 41)
+
+start = time.time()
+regimes = IzhikevichSweep(10, 0.02, 0.2, cs[:, None], ds[None, :],
+                          Tmax=1000, transient=200)
+print 'Izhikevich regime map: %d neurons in %.1f s' % (regimes['rate'].size,
+                                                      time.time() - start)
+
+## F-I curve and first-spike latency of the Hodgkin-Huxley neuron
+Ihh = np.linspace(0, 30, 301)
+
+start = time.time()
+hh = HodgkinHuxleySweep(Ihh, Tmax=500, transient=100)
+print 'Hodgkin-Huxley F-I curve: %d neurons in %.1f s' % (hh['rate'].size,
+                                                         time.time() - start)
+
+## Plot the results
+plt.subplot(221)
+for k in xrange(3):
+  plt.plot(I, iz['rate'][:, k], label=names[k])
+plt.xlabel('Input current I')
+plt.ylabel('Firing rate (Hz)')
+plt.title('Izhikevich F-I curves')
+plt.legend(loc=0)
+
+plt.subplot(222)
+plt.imshow(regimes['isiCV'], origin='lower', aspect='auto',
+           extent=[ds[0], ds[-1], cs[0], cs[-1]])
+plt.colorbar(label='ISI CV')
+plt.xlabel('d')
+plt.ylabel('c')
+plt.title('Izhikevich firing regimes, I = 10')
+
+plt.subplot(223)
+plt.plot(Ihh, hh['rate'])
+plt.xlabel('Input current I')
+plt.ylabel('Firing rate (Hz)')
+plt.title('Hodgkin-Huxley F-I curve')
+
+plt.subplot(224)
+plt.plot(Ihh, hh['latency'])
+plt.xlabel('Input current I')
+plt.ylabel('First spike latency (ms)')
+plt.title('Hodgkin-Huxley latency')
+
+plt.show()
@@ -0,0 +1,82 @@
+"""
+Computational Neurodynamics
+Exercise 1
+
+Simulates the Hodgkin-Huxley neuron model of HHNeuronRK4.py with the
+adaptive Dormand-Prince 5(4) method of SimulationMethods. The step size
+grows between action potentials and shrinks during them, and the times at
+which v crosses the spike threshold are located within the steps.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import sys
+sys.path.append('../../HH_Braitenberg')
+
+import numpy as np
+import matplotlib.pyplot as plt
+from SimulationMethods import dopri5, dopri5_workspace
+from NeuronModels import HodgekinHuxleyInPlace, HodgekinHuxleyWorkspace
+
+## Create time points at which to record the membrane potential. The
+## integrator chooses its own steps in between.
+dt   = 0.1
+Tmin = 0
+Tmax = 100
+T    = np.arange(Tmin, Tmax+dt, dt)
+
+## Parameters of the Hodgkin-Huxley model, packed as [I, gNa, gK, gL, ENa,
+## EK, EL, C] with one column per neuron (a single one here)
+gNa = 120.0
+gK  = 36.0
+gL  = 0.3
+ENa = 115.0
+EK  = -12.0
+EL  = 10.6
+C   = 1.0
+
+# Base current
+I = 10.0
+
+param = np.array([[I], [gNa], [gK], [gL], [ENa], [EK], [EL], [C]])
+
+# Spike threshold
+threshold = 50.0
+
+# Error tolerances of the integrator
+tol = 1e-5
+
+## Initial Values
+x = np.array([[-10.0], [0.], [0.], [0.]])
+
+scratch = HodgekinHuxleyWorkspace(1)
+diff = lambda x, param, out: HodgekinHuxleyInPlace(x, param, out, scratch)
+work = dopri5_workspace(x)
+
+v = np.zeros(len(T))
+v[0] = x[0, 0]
+spikes = []
+h = dt
+evaluations = 0
+
+## SIMULATE
+for t in xrange(len(T)-1):
+
+  h, (fired, times), n = dopri5(x, T[t], T[t+1], param, diff, work, h,
+                                tol, tol, (0, threshold))
+
+  evaluations += n
+  spikes.extend(times)
+  v[t+1] = x[0, 0]
+
+print 'Spike times (ms):', np.round(spikes, 4)
+print 'Evaluations of the model:', evaluations, \
+      '(RK4 at 0.01 ms takes %d)' % (4*int(round((Tmax - Tmin)/0.01)))
+
+## Plot the membrane potential
+plt.plot(T, v)
+plt.plot(spikes, threshold*np.ones(len(spikes)), 'r.')
+plt.xlabel('Time (ms)')
+plt.ylabel('Membrane potential (mV)')
+plt.title('Hodgkin-Huxley Neuron')
+plt.show()
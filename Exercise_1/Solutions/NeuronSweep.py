@@ -0,0 +1,219 @@
+"""
+Computational Neurodynamics
+Exercise 1
+
+Parameter sweeps of single neurons. Instead of simulating one neuron with
+one parameter set per run, as IzNeuronRK4.py and HHNeuronRK4.py do, the
+sweeps simulate thousands of independent neurons at once, one per point of
+a grid of input currents and model parameters, as vectors advanced in the
+same RK4 steps. Only the spikes are kept, and they are summarised per
+parameter point by SpikeStatistics: firing rate, first-spike latency and
+inter-spike interval (ISI) statistics, e.g. for F-I curves or maps of the
+firing regimes. See FISweep.py for an example.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import sys
+sys.path.append('../../HH_Braitenberg')
+
+import numpy as np
+from SimulationMethods import rk4_inplace, rk4_workspace, rush_larsen2
+from SimulationMethods import rush_larsen_workspace
+from NeuronModels import HodgekinHuxleyInPlace, HodgekinHuxleyLinear
+from NeuronModels import HodgekinHuxleyWorkspace, HodgekinHuxleyRates
+
+
+def IzhikevichSweep(I, a=0.02, b=0.2, c=-65.0, d=8.0, Tmax=1000.0, dt=0.05,
+                    transient=0.0, v0=-65.0, u0=None):
+  """
+  Simulate one Izhikevich neuron per combination of the given input current
+  and parameters with the RK4 method, resetting the neurons that reach
+  30 mV after every step, as in IzNeuronRK4.py.
+
+  Inputs:
+  I, a, b, c, d -- Constant input current and model parameters. Scalars or
+                   arrays, broadcast against each other to the shape of the
+                   sweep, e.g. I[:, None] and a[None, :] for a grid.
+  Tmax          -- Simulation time in ms
+  dt            -- RK4 step size in ms
+  transient     -- Time in ms left out of the rates and ISIs, see
+                   SpikeStatistics
+  v0            -- Initial membrane potential
+  u0            -- Initial recovery variable, a scalar or an array of the
+                   shape of the sweep, or None for b*v0. IzNeuronRK4.py
+                   starts at u0 = -1.
+
+  Outputs:
+  Statistics of the spikes of every neuron, as returned by SpikeStatistics,
+  with the shape of the sweep
+  """
+
+  I, a, b, c, d = np.broadcast_arrays(*[np.asarray(p, dtype=float)
+                                        for p in (I, a, b, c, d)])
+  shape = I.shape
+  I, a, b, c, d = [p.ravel() for p in (I, a, b, c, d)]
+  K = len(I)
+
+  if u0 is None:
+    u0 = b * v0
+  else:
+    u0 = np.broadcast_to(np.asarray(u0, dtype=float), shape).ravel()
+
+  x = np.array([v0 * np.ones(K), u0])
+  param = np.array([I, a, b])
+  work = rk4_workspace(x)
+
+  def diff(x, param, out):
+    v, u = x
+    I, a, b = param
+    out[0] = 0.04*v*v + 5*v + 140 - u + I
+    out[1] = a*(b*v - u)
+
+  spikes = []
+  steps = int(round(Tmax / dt))
+  for k in xrange(steps):
+    rk4_inplace(x, dt, param, diff, work)
+
+    fired = np.nonzero(x[0] >= 30)[0]
+    if len(fired) > 0:
+      spikes.append(((k + 1) * dt * np.ones(len(fired)), fired))
+      x[0, fired]  = c[fired]
+      x[1, fired] += d[fired]
+
+  return SpikeStatistics(spikes, shape, Tmax, transient)
+
+
+def HodgkinHuxleySweep(I, gNa=120.0, gK=36.0, gL=0.3, ENa=115.0, EK=-12.0,
+                       EL=10.6, C=1.0, Tmax=200.0, dt=0.01, transient=0.0,
+                       method='rk4', threshold=50.0):
+  """
+  Simulate one Hodgkin-Huxley neuron per combination of the given input
+  current and parameters, with the model of NeuronModels (resting
+  potential of 0 mV, as in HHNeuronRK4.py). Every neuron starts at the
+  resting state of the default parameters, v = 0 with the gating variables
+  at their steady state.
+
+  Inputs:
+  I, gNa, ..., C -- Constant input current and model parameters, broadcast
+                    against each other as in IzhikevichSweep
+  Tmax           -- Simulation time in ms
+  dt             -- Step size in ms
+  transient      -- Time in ms left out of the rates and ISIs
+  method         -- 'rk4', or 'rush-larsen2', which stays stable at larger
+                    steps (see SimulationMethods)
+  threshold      -- A spike is an upward crossing of this potential, timed
+                    by linear interpolation within the step
+
+  Outputs:
+  Statistics of the spikes of every neuron, as returned by SpikeStatistics,
+  with the shape of the sweep
+  """
+
+  values = np.broadcast_arrays(*[np.asarray(p, dtype=float)
+                                 for p in (I, gNa, gK, gL, ENa, EK, EL, C)])
+  shape = values[0].shape
+  param = np.array([p.ravel() for p in values])
+  K = param.shape[1]
+
+  # Steady state of the gating variables at v = 0
+  rates = HodgekinHuxleyRates(np.zeros(1))
+  x = np.zeros([4, K])
+  x[1:] = (rates[:3] / (rates[:3] + rates[3:])) * np.ones(K)
+
+  scratch = HodgekinHuxleyWorkspace(K)
+  if method == 'rk4':
+    work = rk4_workspace(x)
+    diff = lambda x, param, out: HodgekinHuxleyInPlace(x, param, out, scratch)
+    advance = lambda: rk4_inplace(x, dt, param, diff, work)
+  elif method == 'rush-larsen2':
+    work = rush_larsen_workspace(x)
+    linear = lambda x, param, a, b: HodgekinHuxleyLinear(x, param, a, b,
+                                                         scratch)
+    advance = lambda: rush_larsen2(x, dt, param, linear, work)
+  else:
+    raise ValueError('Unknown method %r' % method)
+
+  spikes = []
+  previous = x[0].copy()
+  steps = int(round(Tmax / dt))
+  for k in xrange(steps):
+    advance()
+
+    fired = np.nonzero((previous < threshold) & (x[0] >= threshold))[0]
+    if len(fired) > 0:
+      v0, v1 = previous[fired], x[0, fired]
+      spikes.append(((k + (threshold - v0) / (v1 - v0)) * dt, fired))
+
+    previous[:] = x[0]
+
+  return SpikeStatistics(spikes, shape, Tmax, transient)
+
+
+def SpikeStatistics(spikes, shape, Tmax, transient=0.0):
+  """
+  Summarise the spikes of a sweep per neuron.
+
+  Inputs:
+  spikes    -- List of (times, neurons) arrays, in time order
+  shape     -- Shape of the sweep. Neuron k is point k of the flattened sweep.
+  Tmax      -- Simulation time in ms
+  transient -- Spikes before this time (ms) are left out of count, rate and
+               the ISIs, so that they describe the steady firing. The
+               latency is always taken from time 0.
+
+  Outputs:
+  Dictionary of arrays with the given shape:
+  count    -- Number of spikes after the transient
+  rate     -- Firing rate after the transient, in Hz
+  latency  -- Time of the first spike in ms, NaN if the neuron never fired
+  isiMean  -- Mean ISI in ms after the transient, NaN with fewer than two
+              spikes
+  isiCV    -- Coefficient of variation (std/mean) of the ISIs, NaN with
+              fewer than three spikes. Near 0 for tonic firing, high for
+              bursting.
+  isiMin   -- Shortest ISI in ms, NaN with fewer than two spikes
+  """
+
+  K = int(np.prod(shape))
+  if spikes:
+    times, neurons = [np.concatenate(s) for s in zip(*spikes)]
+  else:
+    times, neurons = np.zeros(0), np.zeros(0, dtype=int)
+
+  # The spikes are in time order, so the first one of every neuron is the
+  # first occurrence of the neuron
+  latency = np.nan * np.ones(K)
+  fired, first = np.unique(neurons, return_index=True)
+  latency[fired] = times[first]
+
+  # Spikes after the transient, sorted by neuron and then by time
+  keep = times >= transient
+  times, neurons = times[keep], neurons[keep]
+  order = np.lexsort((times, neurons))
+  times, neurons = times[order], neurons[order]
+
+  count = np.bincount(neurons, minlength=K)
+
+  # ISIs between consecutive spikes of the same neuron
+  same = neurons[1:] == neurons[:-1]
+  isi = (times[1:] - times[:-1])[same]
+  owner = neurons[1:][same]
+  n = np.bincount(owner, minlength=K)
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    isiMean = np.bincount(owner, isi, minlength=K) / n
+    square = np.bincount(owner, isi * isi, minlength=K) / n
+    isiStd = np.sqrt(np.maximum(square - isiMean**2, 0))
+    isiCV = np.where(n >= 2, isiStd / isiMean, np.nan)
+
+  isiMin = np.inf * np.ones(K)
+  np.minimum.at(isiMin, owner, isi)
+  isiMin[n == 0] = np.nan
+
+  return {'count': count.reshape(shape),
+          'rate': (1000.0 * count / (Tmax - transient)).reshape(shape),
+          'latency': latency.reshape(shape),
+          'isiMean': isiMean.reshape(shape),
+          'isiCV': isiCV.reshape(shape),
+          'isiMin': isiMin.reshape(shape)}
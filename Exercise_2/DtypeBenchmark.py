@@ -0,0 +1,237 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Compares float64 and float32 simulations of IzNetwork, QIFNetwork and
+HhNetwork. The same network, driven by the same noisy input, is run in
+both precisions, and the run time, the memory taken by the state, the
+parameters and the connectivity, and the differences between the rasters
+are reported.
+
+float32 rounding makes the trajectories drift apart, so individual spikes
+eventually differ. The raster comparison reports when the first spike
+differs and how well the population rates of the two runs agree.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import sys
+sys.path.append('Solutions')
+sys.path.append('../HH_Braitenberg')
+
+import time
+import numpy as np
+import scipy.sparse as sp
+from IzNetwork import IzNetwork
+from QIFNetwork import QIFNetwork
+from HhNetwork import HhNetwork
+
+NE = 80000  # Excitatory neurons of the Izhikevich and QIF networks
+NI = 20000  # Inhibitory neurons of the Izhikevich and QIF networks
+NH = 20000  # Neurons in each of the two layers of the HH network
+P  = 0.001  # Connection probability
+D  = 5      # Conduction delay
+T  = 200    # Simulation time of the Izhikevich and QIF networks
+TH = 30     # Simulation time of the HH network
+
+
+def Connect(net, Ns, factors, seed):
+  """
+  Connect the two layers of net all ways with sparse random weights, scaled
+  so that the input per neuron does not depend on the number of neurons.
+
+  Inputs:
+  net     -- Network with two layers
+  Ns      -- Number of neurons of the two layers
+  factors -- factors[i][j] scales the projection from layer j to layer i
+  seed    -- Seed of the weights
+  """
+
+  rs = np.random.RandomState(seed)
+  for i in xrange(2):
+    for j in xrange(2):
+      # About P*Ns[i]*Ns[j] synapses at random positions (duplicates merge)
+      K = int(P * Ns[i] * Ns[j])
+      ij = (rs.randint(Ns[i], size=K), rs.randint(Ns[j], size=K))
+      net.layer[i].S[j] = sp.csr_matrix((rs.rand(K), ij), (Ns[i], Ns[j]))
+      net.layer[i].factor[j] = factors[i][j] / (P * Ns[j])
+      net.layer[i].delay[j] = D
+
+
+def BuildIz(dtype):
+  """
+  Izhikevich PING network: regular spiking excitatory neurons and fast
+  spiking inhibitory ones.
+  """
+
+  rs = np.random.RandomState(1)
+  net = IzNetwork([NE, NI], D + 1, None, dtype)
+
+  # The compiled kernels only run in float64, so both precisions are
+  # compared on the NumPy code
+  net.jit = False
+
+  r = rs.rand(NE)
+  net.layer[0].a = 0.02 * np.ones(NE)
+  net.layer[0].b = 0.20 * np.ones(NE)
+  net.layer[0].c = -65 + 15*(r**2)
+  net.layer[0].d = 8 - 6*(r**2)
+
+  r = rs.rand(NI)
+  net.layer[1].a = 0.02 + 0.08*r
+  net.layer[1].b = 0.25 - 0.05*r
+  net.layer[1].c = -65 * np.ones(NI)
+  net.layer[1].d = 2 * np.ones(NI)
+
+  Connect(net, [NE, NI], [[5, -80], [120, -40]], 2)
+
+  for lr in xrange(2):
+    net.layer[lr].v = -65 * np.ones(net.layer[lr].N)
+    net.layer[lr].u = net.layer[lr].b * net.layer[lr].v
+
+  return net
+
+
+def BuildQIF(dtype):
+  """
+  QIF network with the neuron parameters of ConnectQIF2L.
+  """
+
+  rs = np.random.RandomState(1)
+  net = QIFNetwork([NE, NI], D + 1, dtype)
+
+  for lr, tau in [(0, 10), (1, 5)]:
+    r = rs.rand(net.layer[lr].N)
+    net.layer[lr].R = 1.0
+    net.layer[lr].tau = tau
+    net.layer[lr].vr = -65 + 10*(r**2)
+    net.layer[lr].vc = -50 + 5*(r**2)
+    net.layer[lr].a = 0.2
+    net.layer[lr].v = net.layer[lr].vr
+
+  Connect(net, [NE, NI], [[30, -150], [100, -50]], 2)
+
+  return net
+
+
+def BuildHH(dtype):
+  """
+  Two layers of HH neurons with the parameters of RobotConnect4L,
+  integrated as in RobotRun4L.
+  """
+
+  net = HhNetwork([NH, NH], D + 1, dtype)
+
+  for lr in xrange(2):
+    net.layer[lr].gNa = 120.0
+    net.layer[lr].gK = 36.0
+    net.layer[lr].gL = 0.3
+    net.layer[lr].ENa = 115.0
+    net.layer[lr].EK = -12.0
+    net.layer[lr].EL = 10.6
+    net.layer[lr].C = 1.0
+    net.layer[lr].v = 0.0
+    net.layer[lr].m = 0.05
+    net.layer[lr].n = 0.32
+    net.layer[lr].h = 0.6
+
+  Connect(net, [NH, NH], [[20, -20], [40, -20]], 2)
+  net.SetIntegrator('rush-larsen2', 0.05)
+
+  return net
+
+
+def Run(net, T, Ib, seed):
+  """
+  Simulate net for T milliseconds with a base current Ib plus unit
+  Gaussian noise, the same for any dtype.
+
+  Outputs:
+  firings -- Spikes of the two layers, with layer 1 numbered after layer 0
+  elapsed -- Run time in seconds
+  """
+
+  rs = np.random.RandomState(seed)
+  N0 = net.layer[0].N
+
+  start = time.time()
+  for t in xrange(T):
+    for lr in xrange(2):
+      net.layer[lr].I = Ib[lr] + rs.randn(net.layer[lr].N)
+    net.Update(t)
+  elapsed = time.time() - start
+
+  firings = np.vstack([net.layer[0].firings,
+                       net.layer[1].firings + [0, N0]])
+  return firings, elapsed
+
+
+def Footprint(net):
+  """
+  Bytes taken by the arrays of the layers of net (state and parameters) and
+  by their compiled projections (weights, indices and input buffers).
+  """
+
+  state, connectivity = 0, 0
+  for lr in xrange(net.Nlayers):
+    for value in vars(net.layer[lr]).values():
+      if isinstance(value, np.ndarray):
+        state += value.nbytes
+
+    for proj in net.layer[lr].projection.values():
+      for value in vars(proj).values():
+        if isinstance(value, np.ndarray) and value is not proj.S:
+          connectivity += value.nbytes
+
+  return state, connectivity
+
+
+def Compare(a, b, T, N):
+  """
+  Compare two rasters of [t, neuron] rows.
+
+  Outputs:
+  first -- Time of the first spike found in only one of the rasters
+  same  -- Fraction of the spikes of a also found in b, counting a neuron
+           firing more than once in a millisecond as one spike
+  rate  -- Correlation of the population rates (spikes per ms)
+  """
+
+  keyA = a[:, 0] * N + a[:, 1]
+  keyB = b[:, 0] * N + b[:, 1]
+  only = np.setxor1d(keyA, keyB)
+  first = only.min() // N if len(only) else None
+
+  same = len(np.intersect1d(keyA, keyB)) / max(len(np.unique(keyA)), 1.0)
+  rateA = np.bincount(a[:, 0], minlength=T)
+  rateB = np.bincount(b[:, 0], minlength=T)
+
+  return first, same, np.corrcoef(rateA, rateB)[0, 1]
+
+
+models = [('Izhikevich', BuildIz, T, [5.0, 2.0]),
+          ('QIF', BuildQIF, T, [10.0, 5.0]),
+          ('Hodgkin-Huxley', BuildHH, TH, [8.0, 4.0])]
+
+for name, Build, duration, Ib in models:
+  results = {}
+  for dtype in [np.float64, np.float32]:
+    net = Build(dtype)
+    firings, elapsed = Run(net, duration, Ib, 3)
+    results[dtype] = (firings, elapsed, Footprint(net))
+
+  (a, ta, (sa, ca)), (b, tb, (sb, cb)) = results[np.float64], \
+                                          results[np.float32]
+  first, same, rate = Compare(a, b, duration,
+                              net.layer[0].N + net.layer[1].N)
+
+  print('%s, %d ms' % (name, duration))
+  print('  run time          float64 %7.2f s    float32 %7.2f s' % (ta, tb))
+  print('  state             float64 %7.2f MB   float32 %7.2f MB' %
+        (sa / 1e6, sb / 1e6))
+  print('  connectivity      float64 %7.2f MB   float32 %7.2f MB' %
+        (ca / 1e6, cb / 1e6))
+  print('  spikes            float64 %7d      float32 %7d' % (len(a), len(b)))
+  print('  first difference  %s ms' % first)
+  print('  spikes in common  %.3f' % same)
+  print('  rate correlation  %.3f' % rate)
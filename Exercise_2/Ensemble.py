@@ -0,0 +1,75 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Ensembles of runs forked from one settled network (see Network.Fork). The
+network is built and run through its initial transient once, and every run
+of the ensemble continues from that state with its own setting, e.g. a
+noise seed, a coupling factor or a stimulus. The runs can be spread over
+worker processes, which are forked from this one where the platform allows
+it, so that they share the memory of the settled network, connectivity
+included, instead of receiving copies of it.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import multiprocessing
+
+# Settled network the worker processes fork their runs from
+warm = None
+
+
+def RunEnsemble(net, Trial, settings, processes=None):
+  """
+  Run Trial(fork, setting) on a fork of the network for every setting.
+
+  Inputs:
+  net       -- Settled network to fork the runs from. It is not changed.
+  Trial     -- Function of a fork of net and a setting, which runs the fork
+               and returns its results, e.g. firing rates. With worker
+               processes it has to be defined at module level, and its
+               results must be picklable. The worker processes start with
+               the same state of np.random, so every run should seed its
+               own random numbers from its setting.
+  settings  -- List of the settings of the runs
+  processes -- Number of worker processes, None for one per CPU, or 1 to
+               run the ensemble one run after the other in this process
+
+  Outputs:
+  List of the results of Trial, in the order of settings
+  """
+
+  if processes == 1:
+    return [Trial(net.Fork(), setting) for setting in settings]
+
+  # Share the settled network copy-on-write where processes can be forked,
+  # rather than pickling it for every worker
+  context = multiprocessing
+  if hasattr(multiprocessing, 'get_context'):
+    if 'fork' in multiprocessing.get_all_start_methods():
+      context = multiprocessing.get_context('fork')
+
+  pool = context.Pool(processes, Install, (net,))
+  try:
+    results = pool.map(RunTrial, [(Trial, setting) for setting in settings])
+  finally:
+    pool.terminate()
+    pool.join()
+
+  return results
+
+
+def Install(net):
+  """
+  Keep the settled network in a worker process.
+  """
+  global warm
+  warm = net
+
+
+def RunTrial(job):
+  """
+  Run one trial of an ensemble in a worker process.
+  """
+  Trial, setting = job
+  return Trial(warm.Fork(), setting)
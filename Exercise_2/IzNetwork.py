@@ -1,12 +1,20 @@
 import numpy as np
+import Kernels
+from Network import Network, Layer
+from Synapses import Projection, BlockConnectivity, TrialShape
 
+# Result of Fired when no neuron has fired, by number of dimensions of v
+NO_SPIKES = {1: (np.zeros(0, dtype=np.intp),),
+             2: (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))}
 
-class IzNetwork:
+
+class IzNetwork(Network):
   """
-  Network of Izhikevich neurons.
+  Network of Izhikevich neurons. A Network whose layers are all IzLayer,
+  with an additional flat mode, see Flatten.
   """
 
-  def __init__(self, _neuronsPerLayer, _Dmax):
+  def __init__(self, _neuronsPerLayer, _Dmax, _trials=None, _dtype=float):
     """
     Initialise network with given number of neurons
 
@@ -17,15 +25,31 @@ class IzNetwork:
 
     _Dmax            -- Maximum delay in all the synapses in the network. Any
                         longer delay will result in failing to deliver spikes.
-    """
 
-    self.Dmax = _Dmax
-    self.Nlayers = len(_neuronsPerLayer)
+    _trials          -- Number of independent trials to simulate together, or
+                        None for a single one. With B trials the state
+                        variables v, u and I of every layer are (B, N) arrays,
+                        one row per trial, advanced in the same vectorised
+                        steps. All trials share the connectivity, while
+                        factor[j] can be a scalar or give one factor per trial,
+                        and the parameters a, b, c, d can be (N,) or (B, N).
+                        The firings of batched layers have a third column with
+                        the trial of each spike, see Layer.TrialFirings.
+
+    _dtype           -- Floating point type of the state variables, the
+                        parameters and the synaptic weights, float (float64)
+                        by default. With np.float32 they take half the memory
+                        and bandwidth. Values assigned to the variables of
+                        the layers are converted to it, so that the update
+                        never computes in float64 by accident. The synaptic
+                        input buffers stay float64 (see Synapses.Projection).
+    """
 
-    self.layer = {}
+    Network.__init__(self, [IzLayer(n, _trials, _dtype)
+                            for n in _neuronsPerLayer], _Dmax, _trials, _dtype)
 
-    for i, n in enumerate(_neuronsPerLayer):
-      self.layer[i] = IzLayer(n)
+    # Whether the network runs in flat mode, see Flatten
+    self.flat = False
 
   def Update(self, t):
     """
@@ -33,94 +57,343 @@ class IzNetwork:
     network's internal variables.
 
     Inputs:
-    t -- Current timestep. Necessary to sort out the synaptic delays.
+    t -- Current timestep. Only used to timestamp the spikes.
+    """
+    if self.flat:
+      self.FlatUpdate(t)
+      self.clock += 1
+      self.Monitor()
+    else:
+      Network.Update(self, t)
+
+  def Flatten(self):
     """
-    for lr in xrange(self.Nlayers):
-      self.NeuronUpdate(lr, t)
+    Switch the network to flat mode. The state and parameters of all the
+    layers are concatenated into network-wide arrays (self.v, self.u, ...)
+    and all the projections into one block-sparse connectivity, so that one
+    millisecond of the whole network takes a few vectorised operations
+    instead of a Python loop over layers and projections.
+
+    Call it once the parameters, the initial state and the connectivity of
+    the layers have been set, and again after changing any S, delay or
+    factor. Afterwards net.layer[i].v and friends are views into the
+    network-wide arrays, and assigning to them writes into the views.
+
+    In flat mode all the layers are updated at the same time, so synapses
+    with zero delay are never delivered and layer[i].delivery is ignored.
+    The factors are folded into the network-wide weights, so they must be
+    scalars, and all the layers must have the same step size dt. For
+    batched networks all the flat arrays, parameters included, are (B, N).
+    """
+
+    self.dt = self.layer[0].dt
+    for i in xrange(self.Nlayers):
+      if self.layer[i].dt != self.dt:
+        raise ValueError('Flat mode needs the same step size dt in all the '
+                         'layers')
+
+      for j in self.layer[i].factor:
+        if not np.isscalar(self.layer[i].factor[j]):
+          raise ValueError('Flat mode needs a scalar factor, layer[%d].factor'
+                           '[%d] has one per trial' % (i, j))
+
+    self.offset = np.cumsum([0] + [self.layer[i].N
+                                   for i in xrange(self.Nlayers)])
+
+    shape = TrialShape(self.trials) + [self.offset[-1]]
+    for name in IzLayer.flatVariables:
+      flat = np.zeros(shape, dtype=self.dtype)
+      for i in xrange(self.Nlayers):
+        flat[..., self.offset[i]:self.offset[i+1]] = getattr(self.layer[i],
+                                                             name, 0)
+      setattr(self, name, flat)
+
+    self.BindViews()
+
+    W, delay = BlockConnectivity(self)
+    projection = Projection(W, delay, self.Dmax, W.shape, False, self.trials,
+                            self.dtype)
+    if self.flat:
+      projection.Resume(self.projection)
+
+    self.projection = projection
+    self.flat = True
+
+  def BindViews(self):
+    """
+    Make the variables of the layers views into the network-wide arrays of
+    flat mode, see Flatten.
+    """
+    for name in IzLayer.flatVariables:
+      flat = getattr(self, name)
+      for i in xrange(self.Nlayers):
+        view = flat[..., self.offset[i]:self.offset[i+1]]
+        self.layer[i].BindView(name, view)
+
+  def Connectivity(self):
+    """
+    The connectivity of the network, see Network.Connectivity, including
+    the network-wide projection of flat mode.
+    """
+    shared = Network.Connectivity(self)
+    if self.flat:
+      shared += self.projection.Connectivity()
+    return shared
+
+  def __setstate__(self, state):
+    # Views are pickled as copies, so in flat mode the layers are bound to
+    # the network-wide arrays again
+    self.__dict__.update(state)
+    if self.flat:
+      self.BindViews()
 
-  def NeuronUpdate(self, i, t):
+  def FlatUpdate(self, t):
     """
-    Izhikevich neuron update function. Update one layer for 1 millisecond
-    using the Euler method.
+    Izhikevich neuron update function in flat mode. Update all the layers
+    for 1 millisecond using the Euler method.
 
     Inputs:
-    i -- Number of layer to update
-    t -- Current timestep. Necessary to sort out the synaptic delays.
+    t -- Current timestep. Only used to timestamp the spikes.
     """
 
     # Euler method step size in ms
-    dt = 0.2
-
-    # Calculate current from incoming spikes
-    for j in xrange(self.Nlayers):
-      #LAYER I IS CONNECTED TO LAYER J IF THERE EXISTS A CONNECTIVITY MATIX S[J] I.E LAYER J --> LAYER I
-      # If layer[i].S[j] exists then layer[i].factor[j] and
-      # layer[i].delay[j] have to exist
-      if j in self.layer[i].S:
-        S = self.layer[i].S[j]  # target neuron->rows, source neuron->columns
-
-        # Firings contains time and neuron idx of each spike.
-        # [t, index of the neuron in the layer j]
-        firings = self.layer[j].firings
-
-        # Find incoming spikes taking delays into account
-        delay = self.layer[i].delay[j]
-        F = self.layer[i].factor[j]
-
-        # Sum current from incoming spikes
-        k = len(firings)
-        while k > 0 and (firings[k-1, 0] > (t - self.Dmax)):
-          idx = delay[:, firings[k-1, 1]] == (t-firings[k-1, 0]) #which reveiving neurons have been waiting long enough as all elements of delay are the same, all idx will be true or false
-          self.layer[i].I[idx] += F * S[idx, firings[k-1, 1]]  #firings[k-1,1] is the index of neuron that has fired,
-          # idx the reveiving neurons which have been waiting long enough
-          k = k-1
-
-    # Update v and u using the Izhikevich model and Euler method
-    for k in xrange(int(1/dt)):
-      v = self.layer[i].v
-      u = self.layer[i].u
+    dt = self.dt
+
+    self.projection.Collect(self.clock, self.I)
+
+    block = CompiledEuler(self, dt) if self.jit else None
+    if block is not None:
+      fired, bounds = block
+      neurons = fired[:bounds[-1]]
 
-      self.layer[i].v += dt*(0.04*v*v + 5*v + 140 - u + self.layer[i].I)
-      self.layer[i].u += dt*(self.layer[i].a*(self.layer[i].b*v - u))
+      owner = np.searchsorted(self.offset, neurons, 'right') - 1
+      for lr in np.unique(owner):
+        self.layer[lr].LogSpikes(t, neurons[owner == lr] - self.offset[lr])
+
+      self.projection.ScatterBlock(fired, bounds, self.clock, 1)
+      return
+
+    work = Workspace(self)
+    for k in xrange(int(1/dt)):
+      EulerStep(self, dt, work)
 
-      # Find index of neurons that have fired this millisecond
-      fired = np.where(self.layer[i].v >= 30)[0] #gives the index of the fired neurons i.e the column of the array
+      fired = Fired(self, work)
+      neurons = fired[-1]
+      trials = fired[0] if self.trials else None
 
-      if len(fired) > 0:
-        for f in fired:
-          # Add spikes into spike train
-          if len(self.layer[i].firings) != 0:
-            self.layer[i].firings = np.vstack([self.layer[i].firings, [t, f]])
-          else:
-            self.layer[i].firings = np.array([[t, f]])
+      if len(neurons) > 0:
+        # Split the spikes by layer using the offset table
+        owner = np.searchsorted(self.offset, neurons, 'right') - 1
+        for lr in np.unique(owner):
+          sel = owner == lr
+          self.layer[lr].LogSpikes(t, neurons[sel] - self.offset[lr],
+                                   None if trials is None else trials[sel])
 
-          # Reset the membrane potential after spikes
-          self.layer[i].v[f]  = self.layer[i].c[f]
-          self.layer[i].u[f] += self.layer[i].d[f]
+        self.v[fired]  = self.c[fired]
+        self.u[fired] += self.d[fired]
 
-    return
+        self.projection.Scatter(neurons, self.clock, 1, trials)
 
 
-class IzLayer:
+class IzLayer(Layer):
   """
-  Layer of Izhikevich neurons to be used inside an IzNetwork.
+  Layer of Izhikevich neurons, integrated with the Euler method.
+
+  With Numba available (see Kernels), unbatched float64 layers whose v, u,
+  I, a, b, c and d are vectors run each millisecond as one compiled kernel,
+  with the same firings as the NumPy steps.
   """
 
-  def __init__(self, n):
-    """
-    Initialise layer with empty vectors.
+  stateVariables = ('v', 'u')
 
-    Inputs:
-    n -- Number of neurons in the layer
+  # State variables and parameters that IzNetwork.Flatten turns into views
+  flatVariables = ('v', 'u', 'I', 'a', 'b', 'c', 'd')
+
+  # State variables that get one row per trial in batched networks
+  trialVariables = ('v', 'u', 'I')
+
+  def __init__(self, n, trials=None, dtype=float):
+    """
+    Initialise layer with empty vectors. Inputs as in Layer.
     """
 
-    self.N = n
+    Layer.__init__(self, n, trials, dtype)
+
     self.a = np.zeros(n)
     self.b = np.zeros(n)
     self.c = np.zeros(n)
     self.d = np.zeros(n)
 
-    self.S      = {}
-    self.delay  = {}
-    self.factor = {}
+    # Euler method step size in ms
+    self.dt = 0.2
+
+  def Step(self):
+    """
+    Advance v and u by one Euler step of the Izhikevich model, in place.
+    """
+
+    # Potentials given as scalars are spread to one per neuron first
+    shape = TrialShape(self.trials) + [self.N]
+    if np.shape(self.v) != tuple(shape):
+      self.v = self.v * np.ones(shape)
+    if np.shape(self.u) != tuple(shape):
+      self.u = self.u * np.ones(shape)
+
+    EulerStep(self, self.dt, Workspace(self))
+
+  def Threshold(self, t):
+    """
+    Neurons at or above the peak of the spike, 30 mV.
+    """
+    return Fired(self, Workspace(self))
+
+  def AddCurrent(self, current):
+    """
+    Add the synaptic input to I in a buffer of the layer, which becomes I,
+    instead of a new array every millisecond.
+    """
+
+    buffer = self.__dict__.get('Ibuffer')
+    if buffer is None or buffer.shape != current.shape:
+      buffer = np.zeros(current.shape, dtype=self.dtype)
+      self.Ibuffer = buffer
+
+    np.add(self.I, current, out=buffer, dtype=buffer.dtype)
+    self.I = buffer
+
+  def Reset(self, fired):
+    """
+    Reset the membrane potential after spikes. The parameters may have one
+    row per trial or be shared by all of them.
+    """
+
+    c = np.broadcast_to(self.c, self.v.shape)
+    d = np.broadcast_to(self.d, self.u.shape)
+    self.v[fired]  = c[fired]
+    self.u[fired] += d[fired]
+
+  def CompiledUpdate(self):
+    """
+    A millisecond of Euler steps as one compiled kernel, see Layer.
+    """
+    return CompiledEuler(self, self.dt)
+
+  def __setattr__(self, name, value):
+    # In batched layers the state variables are spread to one row per trial,
+    # so that assigning a (N,) array sets all the trials alike
+    if (self.__dict__.get('trials') and name in IzLayer.trialVariables and
+        np.shape(value) != (self.trials, self.N)):
+      value = value * np.ones([self.trials, self.N])
+
+    # State variables and parameters are kept in the dtype of the layer
+    if name in IzLayer.flatVariables:
+      value = self.Cast(value)
+
+    # Variables bound to views of network-wide arrays are written in place,
+    # so that the scripts can keep assigning to them as usual
+    if name in self.__dict__.get('views', ()):
+      self.__dict__[name][...] = value
+    else:
+      object.__setattr__(self, name, value)
+
+  def BindView(self, name, view):
+    """
+    Replace a variable of the layer with a view into a network-wide array.
+    Later assignments to the variable write into the view.
+    """
+    views = self.__dict__.get('views', ())
+    self.__dict__[name] = view
+    if name not in views:
+      self.__dict__['views'] = views + (name,)
+
+
+def CompiledEuler(x, dt):
+  """
+  Advance the neurons of x, an IzLayer or an IzNetwork in flat mode, by
+  1 millisecond of Euler steps of size dt with the compiled kernel
+  Kernels.IzMillisecond.
+
+  Outputs:
+  fired, bounds -- The neurons that fired in each step, see
+                   Kernels.IzMillisecond, overwritten by the next call. None
+                   if x is batched or its variables are not float64 vectors.
+  """
+
+  if x.trials or not Kernels.Compatible(np.size(x.v), x.v, x.u, x.I, x.a,
+                                        x.b, x.c, x.d):
+    return None
+
+  steps = int(1/dt)
+  size = steps * len(x.v)
+  buffers = x.__dict__.get('kernelBuffers')
+  if buffers is None or len(buffers[0]) != size:
+    buffers = (np.zeros(size, dtype=int), np.zeros(steps + 1, dtype=int))
+    x.kernelBuffers = buffers
+
+  fired, bounds = buffers
+  Kernels.IzMillisecond(x.v, x.u, x.I, x.a, x.b, x.c, x.d, steps, dt, fired,
+                        bounds)
+  return fired, bounds
+
+
+def Workspace(x):
+  """
+  Scratch arrays of x, an IzLayer or an IzNetwork in flat mode, for
+  EulerStep and Fired: two arrays shaped like v, in its dtype, and a
+  boolean mask. Allocated on first use and kept in x.eulerWork.
+  """
+
+  work = x.__dict__.get('eulerWork')
+  if work is None or work[0].shape != x.v.shape or work[0].dtype != x.v.dtype:
+    work = (np.empty_like(x.v), np.empty_like(x.v),
+            np.empty(x.v.shape, dtype=bool))
+    x.eulerWork = work
+
+  return work
+
+
+def EulerStep(x, dt, work):
+  """
+  Advance v and u of x, an IzLayer or an IzNetwork in flat mode, by one
+  Euler step of size dt. The update is
+
+    v += dt*(0.04*v*v + 5*v + 140 - u + I)
+    u += dt*(a*(b*v - u))
+
+  written in place into the scratch arrays of work (see Workspace) with the
+  same operations in the same order, so the results are the same as the
+  expressions' (and Kernels.IzMillisecond's) without their temporary arrays.
+  """
+
+  v, u = x.v, x.u
+  s, w = work[0], work[1]
+
+  np.multiply(0.04, v, out=s)
+  s *= v
+  np.multiply(5, v, out=w)
+  s += w
+  s += 140
+  s -= u
+  s += x.I
+  s *= dt
+  v += s
+
+  np.multiply(x.b, v, out=s)
+  s -= u
+  s *= x.a
+  s *= dt
+  u += s
+
+
+def Fired(x, work):
+  """
+  Neurons of x at or above 30 mV, as the tuple np.where gives, found with
+  the boolean mask of work. When none has fired no index arrays are made.
+  """
+
+  mask = work[2]
+  np.greater_equal(x.v, 30, out=mask)
+  if not mask.any():
+    return NO_SPIKES[mask.ndim]
 
+  return np.nonzero(mask)
@@ -0,0 +1,138 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Compiled kernels for the millisecond update of IzNetwork. They are compiled
+with Numba when it can be imported; otherwise available is False and the
+networks keep to their NumPy code. The kernels do the same floating point
+operations in the same order as the NumPy code, so the firings do not depend
+on which of the two is used.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import numpy as np
+
+try:
+  from numba import njit
+  available = True
+except ImportError:
+  available = False
+
+  def njit(f):
+    return f
+
+
+@njit
+def IzMillisecond(v, u, I, a, b, c, d, steps, dt, fired, bounds):
+  """
+  Advance Izhikevich neurons by a number of Euler steps, resetting the ones
+  that reach threshold after every step.
+
+  Inputs:
+  v, u       -- Membrane potentials and recovery variables, updated in place
+  I          -- Input current, held constant over the steps
+  a, b, c, d -- Parameters of every neuron
+  steps      -- Number of Euler steps
+  dt         -- Euler step size in ms
+  fired      -- Array with room for steps*len(v) indices, where the neurons
+                that fire are written in the order they fire
+  bounds     -- Array of steps+1 positions, where the spikes of step k are
+                written to fired[bounds[k]:bounds[k+1]]
+
+  Outputs:
+  Total number of spikes
+  """
+
+  n = 0
+  bounds[0] = 0
+
+  for k in range(steps):
+    for j in range(len(v)):
+      vj = v[j]
+      v[j] = vj + dt*(0.04*vj*vj + 5*vj + 140 - u[j] + I[j])
+      u[j] = u[j] + dt*(a[j]*(b[j]*v[j] - u[j]))
+
+      if v[j] >= 30:
+        v[j] = c[j]
+        u[j] = u[j] + d[j]
+        fired[n] = j
+        n += 1
+
+    bounds[k+1] = n
+
+  return n
+
+
+@njit
+def ScatterLags(fired, clock, F, indptr, indices, weight, lag, buffer):
+  """
+  Add the spikes of the given source neurons to a ring buffer through a
+  fan-out table with one delay per synapse, as Projection.Scatter does.
+  """
+
+  Dmax = buffer.shape[0]
+  for s in fired:
+    for syn in range(indptr[s], indptr[s+1]):
+      buffer[(clock + lag[syn]) % Dmax, indices[syn]] += F*weight[syn]
+
+
+@njit
+def ScatterUniformLag(fired, bounds, slot, F, indptr, indices, weight, buffer,
+                      total, touched, marked):
+  """
+  Add the spikes of the given source neurons to one slot of a ring buffer
+  through a fan-out table with a uniform delay. As in Projection.Scatter, the
+  input of every group fired[bounds[k]:bounds[k+1]] is summed in total before
+  it is added to the buffer. total (all zeros) and marked (all False) are
+  left as they are given; touched is scratch space of the same length.
+  """
+
+  N = len(total)
+  for k in range(len(bounds) - 1):
+    group = fired[bounds[k]:bounds[k+1]]
+
+    events = 0
+    for s in group:
+      events += indptr[s+1] - indptr[s]
+
+    if events >= N:
+      # Dense enough to add the whole of total, zeros included, to the buffer
+      for s in group:
+        for syn in range(indptr[s], indptr[s+1]):
+          total[indices[syn]] += F*weight[syn]
+
+      for i in range(N):
+        buffer[slot, i] += total[i]
+        total[i] = 0
+
+    else:
+      # Otherwise only the targets reached by the group, each listed once
+      m = 0
+      for s in group:
+        for syn in range(indptr[s], indptr[s+1]):
+          i = indices[syn]
+          if not marked[i]:
+            marked[i] = True
+            touched[m] = i
+            m += 1
+          total[i] += F*weight[syn]
+
+      for i in touched[:m]:
+        buffer[slot, i] += total[i]
+        total[i] = 0
+        marked[i] = False
+
+
+def Compatible(N, *arrays):
+  """
+  Whether the given arrays can be passed to the kernels as they are, i.e.
+  are all one-dimensional float arrays of length N.
+  """
+
+  for x in arrays:
+    if (not isinstance(x, np.ndarray) or x.dtype != np.float64 or
+        x.shape != (N,)):
+      return False
+
+  return True
@@ -0,0 +1,500 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Network engine shared by IzNetwork, QIFNetwork and HhNetwork, and the base
+class of the layers of every neuron model.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import os
+import copy
+import pickle
+import numpy as np
+import Kernels
+from Synapses import ScatterSpikes, ScatterSpikeBlock, IncomingCurrent
+from Synapses import TrialShape, ReadOnly
+from SpikeLog import SpikeLog, SpikeWindow
+from Recorder import Recorder
+from RateMonitor import RateMonitor
+from SpikeStore import SpikeStore, Logged
+
+
+class Network(object):
+  """
+  Network of layers of spiking neurons. The network delivers the spikes
+  from layer to layer with their synaptic delays and logs them, while the
+  dynamics of the neurons are left to the layers, which implement the
+  neuron model interface described in Layer. Layers of different models
+  can be mixed in one network.
+  """
+
+  def __init__(self, layers, Dmax, trials=None, dtype=float):
+    """
+    Initialise a network made of the given layers.
+
+    Inputs:
+    layers -- List of layers, e.g. [IzLayer(800), QIFLayer(200)]. Layer i
+              becomes self.layer[i].
+    Dmax   -- Maximum delay in all the synapses in the network. Any longer
+              delay will result in failing to deliver spikes.
+    trials -- Number of trials of a batched network, or None. The layers
+              must have been created for the same number of trials.
+    dtype  -- Floating point type of the synaptic weights and the input
+              passed to the layers, see IzNetwork
+    """
+
+    self.Dmax = Dmax
+    self.Nlayers = len(layers)
+    self.trials = trials
+    self.dtype = dtype
+
+    self.layer = dict(enumerate(layers))
+
+    # Number of calls to Update so far. Indexes the circular input buffers
+    # independently of the t the scripts pass in, which may be reset.
+    self.clock = 0
+
+    # Whether to let the layers that have one run their millisecond as a
+    # compiled kernel (see Layer.CompiledUpdate), when Numba is available
+    self.jit = Kernels.available
+
+    # State recorders, see Record
+    self.recorders = []
+
+  def Update(self, t):
+    """
+    Run simulation of the whole network for 1 millisecond and update the
+    network's internal variables.
+
+    Inputs:
+    t -- Current timestep. Only used to timestamp the spikes.
+    """
+    for lr in xrange(self.Nlayers):
+      self.NeuronUpdate(lr, t)
+
+    self.clock += 1
+    self.Monitor()
+
+  def Record(self, i, variables=('v',), neurons=None, interval=1, T=1000,
+             path=None, chunk=1000, dtype=None):
+    """
+    Start recording variables of neurons of layer i, from the next update
+    on. See Recorder for the inputs.
+
+    Outputs:
+    The Recorder. Its Data(name) gives the samples of a variable so far.
+    """
+
+    recorder = Recorder(self.layer[i], variables, neurons, interval, T, path,
+                        chunk, dtype, self.clock)
+    self.recorders.append(recorder)
+    return recorder
+
+  def MonitorRate(self, i, window=100, tau=10.0):
+    """
+    Start counting the spikes of layer i online, from the next update on.
+    See RateMonitor for the inputs.
+
+    Outputs:
+    The RateMonitor. Its Rate() gives the mean firing rate of the layer
+    over the last window ms, and SmoothRate() an exponentially smoothed
+    rate.
+    """
+
+    lay = self.layer[i]
+    monitor = RateMonitor(lay.N, lay.trials, window, tau, self.clock)
+    lay.rates.append(monitor)
+    return monitor
+
+  def StoreSpikes(self, path, chunk=65536):
+    """
+    Stream the spikes of every layer to disk from now on, instead of keeping
+    them in memory. The spikes of layer i go to a SpikeStore with prefix
+    <path>_<i>, and its exact spike times, if it logs them, to
+    <path>_<i>_exact. The spikes logged so far are written to the new
+    stores first, except those of a fork logged before it was forked (see
+    Fork). layer.firings and layer.exact keep working, reading the files
+    back.
+
+    Inputs:
+    path  -- Prefix of the files
+    chunk -- Number of spikes per layer gathered in memory between writes
+    """
+
+    for i in xrange(self.Nlayers):
+      lay = self.layer[i]
+
+      # Read the spikes before the new store truncates its files, which may
+      # be the ones of the current store
+      firings = Logged(lay.spikes)
+      lay.spikes = SpikeStore('%s_%d' % (path, i), chunk,
+                              columns=2 if lay.trials is None else 3)
+      lay.spikes.Load(firings)
+
+      if getattr(lay, 'exactSpikes', None) is not None:
+        exact = Logged(lay.exactSpikes)
+        lay.exactSpikes = SpikeStore('%s_%d_exact' % (path, i), chunk, float)
+        lay.exactSpikes.Load(exact)
+
+  def FlushSpikes(self):
+    """
+    Write the spikes gathered in memory by the spike stores to their files,
+    e.g. at the end of a run, see StoreSpikes.
+    """
+
+    for i in xrange(self.Nlayers):
+      lay = self.layer[i]
+      for log in (lay.spikes, getattr(lay, 'exactSpikes', None)):
+        if isinstance(log, SpikeStore):
+          log.Flush()
+
+  def RetainSpikes(self, window=None, sinks=None):
+    """
+    Bound the spike history of every layer: from now on layer.firings only
+    keeps the spikes of the last window milliseconds of the network clock,
+    and older spikes are passed on to a sink or dropped. Synaptic delivery
+    does not read the firings, so this does not change the simulation.
+    The exact spike times of layers that log them, see layer.exact, are
+    bounded to the same window, and older ones are dropped.
+
+    Inputs:
+    window -- Number of milliseconds of spikes to keep, Dmax by default
+    sinks  -- Dictionary from layer numbers to where their older spikes go,
+              e.g. {0: SpikeLog(), 1: SpikeStore('run_1')}, see SpikeWindow.
+              The spikes of layers left out are dropped.
+    """
+
+    if window is None:
+      window = self.Dmax
+    if sinks is None:
+      sinks = {}
+
+    for i in xrange(self.Nlayers):
+      lay = self.layer[i]
+      firings = lay.spikes.Array()
+      lay.spikes = SpikeWindow(window, sinks.get(i), firings.dtype,
+                               firings.shape[1], self.clock)
+      lay.spikes.Load(firings)
+
+      if getattr(lay, 'exactSpikes', None) is not None:
+        exact = lay.exactSpikes.Array()
+        lay.exactSpikes = SpikeWindow(window, None, exact.dtype,
+                                      exact.shape[1], self.clock)
+        lay.exactSpikes.Load(exact)
+
+  def SaveCheckpoint(self, path, rng=np.random):
+    """
+    Save the whole state of the network to a file, so that a run can be
+    resumed from it with LoadCheckpoint exactly as if it had not been
+    interrupted: the state variables, parameters and input currents of the
+    layers, the connectivity, the spikes in flight in the synaptic buffers,
+    the spike logs, the clock, and the state of a random number generator.
+
+    Recorders are not saved, attach new ones after loading. Spike stores
+    (see StoreSpikes) keep their files, which LoadCheckpoint cuts back to
+    the spikes written when the checkpoint was saved. It fails if they no
+    longer hold all of those spikes, so load a checkpoint before calling
+    StoreSpikes with the same path.
+
+    The file is written next to path and then renamed, so that a run
+    interrupted while saving keeps its previous checkpoint.
+
+    Inputs:
+    path -- Name of the checkpoint file
+    rng  -- np.random or a np.random.RandomState whose state to save, or
+            None
+    """
+
+    state = None if rng is None else rng.get_state()
+
+    with open(path + '.tmp', 'wb') as f:
+      pickle.dump((state, self), f, pickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
+
+  def LoadCheckpoint(self, path, rng=np.random):
+    """
+    Restore the state saved by SaveCheckpoint into this network, which must
+    be of the same class. The random number generator rng, if given, is
+    set to the state saved with the checkpoint.
+    """
+
+    with open(path, 'rb') as f:
+      state, net = pickle.load(f)
+
+    if type(net) is not type(self):
+      raise ValueError('The checkpoint is of a %s, not a %s' %
+                       (type(net).__name__, type(self).__name__))
+
+    self.__dict__.clear()
+    self.__dict__.update(net.__dict__)
+
+    if rng is not None and state is not None:
+      rng.set_state(state)
+
+  def Fork(self):
+    """
+    Copy of the network in its current state, to continue a run from it
+    independently of the original, e.g. with another noise seed, other
+    factors or another stimulus. A network can be settled once and then
+    forked as many times as needed, instead of simulating its initial
+    transient in every run. See Ensemble.RunEnsemble to run forks in
+    worker processes.
+
+    The state of the neurons, the spikes in flight and the spike logs are
+    copied, while the connectivity (see Connectivity) is shared with the
+    original through read-only views, so forks take no memory for it. The
+    original stays writable, but changes made to its connectivity in place
+    show through in its forks: assign new S and delay matrices instead.
+    Likewise, assign new S and delay matrices to a fork to change its
+    connectivity, and call Flatten on a flat fork after changing its
+    factors. Recorders are not copied.
+
+    A fork does not share the files of the original's spike stores (see
+    StoreSpikes): its stores are detached, and it cannot log or read spikes
+    until StoreSpikes is called on it with a new path. The spikes logged
+    before the fork stay in the files of the original.
+    """
+
+    # The layers and their projections refer to the same S and delay
+    # objects, so each is mapped to one view, and the projections still
+    # match their layers in the fork
+    memo = dict((id(x), ReadOnly(x)) for x in self.Connectivity())
+    return copy.deepcopy(self, memo)
+
+  def Recompile(self):
+    """
+    Compile the connectivity of every layer again at the next update, e.g.
+    after S or delay matrices were changed in place. Spikes in flight are
+    kept. Replacing S[j] or delay[j] by another object needs no call.
+    """
+
+    for i in xrange(self.Nlayers):
+      for proj in self.layer[i].projection.values():
+        proj.stale = True
+
+    if getattr(self, 'flat', False):
+      self.Flatten()
+
+  def Connectivity(self):
+    """
+    The objects that make up the connectivity of the network: the S and
+    delay matrices of the layers and the tables compiled from them by the
+    projections.
+    """
+
+    shared = []
+    for i in xrange(self.Nlayers):
+      lay = self.layer[i]
+      shared += list(lay.S.values()) + list(lay.delay.values())
+      for proj in lay.projection.values():
+        shared += proj.Connectivity()
+
+    return shared
+
+  def __getstate__(self):
+    # Recorders write to their own files and are not part of a checkpoint
+    # or a fork
+    state = self.__dict__.copy()
+    state['recorders'] = []
+    return state
+
+  def Monitor(self):
+    """
+    Bookkeeping after every update: the recorders take their samples of the
+    millisecond just simulated, the rate monitors close their count of it,
+    and the bounded spike histories pass on the spikes that have left their
+    window.
+    """
+
+    for recorder in self.recorders:
+      recorder.Sample(self.clock - 1)
+
+    for i in xrange(self.Nlayers):
+      for monitor in self.layer[i].rates:
+        monitor.Advance()
+
+    for i in xrange(self.Nlayers):
+      lay = self.layer[i]
+      for log in (lay.spikes, getattr(lay, 'exactSpikes', None)):
+        if isinstance(log, SpikeWindow):
+          log.Expire(self.clock)
+
+  def NeuronUpdate(self, i, t):
+    """
+    Update one layer for 1 millisecond: add the synaptic input arriving
+    now to its current I, then advance it step by step, logging the spikes
+    of every step, resetting the neurons that fired and sending their
+    spikes on to the layers they project to.
+
+    Inputs:
+    i -- Number of layer to update
+    t -- Current timestep, used to timestamp the spikes
+    """
+
+    lay = self.layer[i]
+
+    # Spikes have already been scattered into the circular buffer slot of
+    # their arrival time, so all that is left is to read the current slot
+    # and clear it
+    lay.AddCurrent(IncomingCurrent(self, i, lay.current))
+
+    if self.jit:
+      block = lay.CompiledUpdate()
+      if block is not None:
+        fired, bounds = block
+        if bounds[-1] > 0:
+          lay.LogSpikes(t, fired[:bounds[-1]])
+          ScatterSpikeBlock(self, i, fired, bounds)
+        return
+
+    for k in xrange(lay.Steps()):
+      lay.Step()
+
+      # Indices of the neurons that have fired, as a tuple (trials,
+      # neurons) for batched networks
+      fired = lay.Threshold(t)
+      neurons = fired[-1]
+      trials = fired[0] if self.trials else None
+
+      if len(neurons) > 0:
+        lay.LogSpikes(t, neurons, trials)
+        lay.Reset(fired)
+        ScatterSpikes(self, i, neurons, trials)
+
+
+class Layer(object):
+  """
+  Base class of the layers of a Network. It holds the connectivity and the
+  spike log of the layer, and defines the interface a neuron model
+  implements:
+
+    stateVariables -- Names of the state variables of the model
+    Steps()        -- Number of integration steps per millisecond
+    Step()         -- Advance every neuron by one step, with the input
+                      current I held constant
+    Threshold(t)   -- Neurons that have fired in the last step, as the
+                      tuple of index arrays np.where gives
+    Reset(fired)   -- Reset the neurons that have fired
+    AddCurrent(x)  -- Add the synaptic input x to the input current I. By
+                      default I = I + x.
+
+  Threshold and Reset are called after every step, so models whose spikes
+  should only be looked for once per millisecond take a single step per
+  millisecond. Models can also provide CompiledUpdate, a faster equivalent
+  of a whole millisecond of steps.
+  """
+
+  stateVariables = ()
+
+  def __init__(self, n, trials=None, dtype=float):
+    """
+    Initialise layer with no connections. S[j] and delay[j] can be dense
+    arrays or scipy.sparse matrices, or scalars for uniform weights
+    (all-to-all) and uniform delays.
+
+    S[j] and delay[j] are compiled into projection[j] at the first update
+    that delivers spikes through them, and again whenever they are replaced
+    by other objects. Changes made to them in place, e.g. S[j][k, l] = w,
+    only take effect after Network.Recompile. factor[j] is read at every
+    update, except in flat mode, see Flatten.
+
+    Inputs:
+    n      -- Number of neurons in the layer
+    trials -- Number of trials of a batched network, or None
+    dtype  -- Floating point type of the state variables and parameters
+    """
+
+    self.dtype = dtype
+    self.trials = trials
+    self.N = n
+
+    self.S      = {}
+    self.delay  = {}
+    self.factor = {}
+
+    # Delivery method of each projection, 'ring' (default) or 'bucket'
+    self.delivery = {}
+
+    # Compiled fan-out tables and input buffers, see Synapses.Projection
+    self.projection = {}
+
+    self.spikes = SpikeLog(columns=2 if trials is None else 3)
+
+    # Online rate monitors, see Network.MonitorRate
+    self.rates = []
+
+    # Synaptic input of the current millisecond, summed here in float64
+    # before it is added to I, see Synapses.IncomingCurrent
+    self.current = np.zeros(TrialShape(trials) + [n])
+
+  def Cast(self, value):
+    """
+    Convert a value assigned to a state variable or parameter to the dtype
+    of the layer, keeping scalars as scalars.
+    """
+    if np.ndim(value) == 0:
+      return np.dtype(self.dtype).type(value)
+    return np.asarray(value, dtype=self.dtype)
+
+  def Steps(self):
+    """
+    Number of integration steps per millisecond.
+    """
+    return int(1/self.dt)
+
+  def Reset(self, fired):
+    """
+    Reset the neurons that have fired. Nothing to do by default.
+    """
+    pass
+
+  def AddCurrent(self, current):
+    """
+    Add the synaptic input of the current millisecond, a float64 array, to
+    the input current I.
+    """
+    self.I = self.I + current.astype(self.dtype, copy=False)
+
+  def LogSpikes(self, t, neurons, trials=None):
+    """
+    Log spikes of the layer fired at time t, and count them in its rate
+    monitors.
+    """
+    self.spikes.Append(t, neurons, trials)
+    for monitor in self.rates:
+      monitor.Add(neurons, trials)
+
+  def CompiledUpdate(self):
+    """
+    Advance the layer by a whole millisecond of steps at once, with the same
+    results as Step, Threshold and Reset, if the model has a compiled
+    kernel for it.
+
+    Outputs:
+    fired, bounds -- The neurons that fired in each step, as in
+                     Kernels.IzMillisecond, or None if there is no kernel
+    """
+    return None
+
+  @property
+  def firings(self):
+    """
+    Spikes of the layer as a (K, 2) array of [t, index of the neuron] rows,
+    or (K, 3) with the trial of each spike in batched layers. Assigning an
+    array (e.g. np.array([])) replaces the contents of the log.
+    """
+    return self.spikes.Array()
+
+  @firings.setter
+  def firings(self, value):
+    self.spikes.Load(value)
+
+  def TrialFirings(self, trial):
+    """
+    Spikes of one trial of a batched layer as a (K, 2) array of
+    [t, index of the neuron] rows, like the firings of an unbatched layer.
+    """
+    firings = self.spikes.Array()
+    return firings[firings[:, 2] == trial, :2]
@@ -0,0 +1,112 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Online firing rate monitors of the Network engine, created with
+Network.MonitorRate. A monitor counts the spikes of a layer as they are
+logged, and keeps the counts of the last window milliseconds in a ring
+buffer together with their running sum, and an exponentially smoothed rate.
+Reading the rate of a layer, e.g. in a closed-loop controller or a live
+plot, then costs O(1) per millisecond instead of a scan of its firings.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import numpy as np
+from Synapses import TrialShape
+
+
+class RateMonitor:
+  """
+  Spike counts and firing rate of one layer, per trial in batched layers.
+  Rates are mean rates per neuron in Hz.
+  """
+
+  def __init__(self, N, trials=None, window=100, tau=10.0, clock=0):
+    """
+    Initialise a monitor with no spikes counted. Use Network.MonitorRate
+    rather than calling this.
+
+    Inputs:
+    N      -- Number of neurons of the layer
+    trials -- Number of trials of a batched layer, or None
+    window -- Number of milliseconds of counts kept in the ring buffer
+    tau    -- Time constant of the smoothed rate in ms
+    clock  -- Current clock of the network, i.e. the number of the next
+              millisecond to be simulated
+    """
+
+    self.N = N
+    self.window = window
+    self.decay = np.exp(-1.0 / tau)
+    self.clock = clock
+
+    shape = TrialShape(trials)
+    self.counts = np.zeros([window] + shape, dtype=int)
+    self.total = np.zeros(shape, dtype=int)
+    self.current = np.zeros(shape, dtype=int)
+    self.smooth = np.zeros(shape)
+
+  def Add(self, neurons, trials=None):
+    """
+    Count spikes logged in the current millisecond. Called by the layer.
+    """
+    if trials is None:
+      self.current += len(neurons)
+    else:
+      self.current += np.bincount(trials, minlength=len(self.current))
+
+  def Advance(self):
+    """
+    Close the current millisecond: move its count into the ring buffer and
+    update the smoothed rate. Called by the network after every update.
+    """
+
+    slot = self.clock % self.window
+    self.total += self.current - self.counts[slot]
+    self.counts[slot] = self.current
+
+    self.smooth *= self.decay
+    self.smooth += (1 - self.decay) * 1000.0 * self.current / self.N
+
+    self.current[...] = 0
+    self.clock += 1
+
+  def Count(self, window=None):
+    """
+    Number of spikes in the last window milliseconds, all of the ring
+    buffer by default.
+    """
+
+    if window is None or window == self.window:
+      return self.total.copy()
+    if window > self.window:
+      raise ValueError('The monitor only keeps %d ms of counts' %
+                       self.window)
+
+    slots = (self.clock - 1 - np.arange(window)) % self.window
+    return self.counts[slots].sum(0)
+
+  def Rate(self, window=None):
+    """
+    Mean firing rate in Hz over the last window milliseconds, all of the
+    ring buffer by default. Milliseconds before the monitor was created
+    count as silent.
+    """
+    if window is None:
+      window = self.window
+    return self.Count(window) * 1000.0/(window*self.N)
+
+  def SmoothRate(self):
+    """
+    Firing rate in Hz smoothed with an exponential filter of time constant
+    tau.
+    """
+    return self.smooth.copy()
+
+  def History(self):
+    """
+    Spike counts of the last window milliseconds, oldest first, one row per
+    millisecond.
+    """
+    return np.roll(self.counts, -(self.clock % self.window), axis=0)
@@ -0,0 +1,146 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+State recorders of the Network engine, created with Network.Record. Instead
+of copying every neuron's state into T x N arrays every millisecond, a
+recorder takes chosen variables of chosen neurons of one layer every few
+milliseconds, and writes them to memory-mapped .npy files in chunks.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class Recorder:
+  """
+  Record of variables of a subset of the neurons of one layer, sampled at
+  the end of every interval-th millisecond, starting with the first
+  millisecond simulated after the recorder is created (see Times).
+
+  The samples are gathered in a buffer of chunk rows in memory, which is
+  written to the files in one go when it is full. Without a path the
+  records are kept in memory instead. Variables that are not recorded
+  cost nothing.
+  """
+
+  def __init__(self, layer, variables, neurons, interval, T, path=None,
+               chunk=1000, dtype=None, clock=0):
+    """
+    Initialise an empty record. Use Network.Record rather than calling this.
+
+    Inputs:
+    layer     -- Layer to record from
+    variables -- Names of the variables of the layer, e.g. ('v', 'u')
+    neurons   -- Indices of the neurons to record, or None for all of them
+    interval  -- Sampling interval in ms
+    T         -- Duration of the record in ms. Room for T/interval samples
+                 is allocated; later samples are not taken.
+    path      -- Prefix of the files, one per variable, named
+                 <path>_<variable>.npy and readable with
+                 np.load(..., mmap_mode='r'). None to keep the records in
+                 memory.
+    chunk     -- Number of samples gathered in memory before they are
+                 written to the files
+    dtype     -- Type of the records, the dtype of the layer by default
+    clock     -- Current clock of the network, i.e. the number of the next
+                 millisecond to be simulated
+    """
+
+    self.layer = layer
+    self.variables = tuple(variables)
+    self.interval = interval
+    self.path = path
+
+    if neurons is not None:
+      neurons = np.asarray(neurons, dtype=np.intp)
+      if np.any(neurons < 0) or np.any(neurons >= layer.N):
+        raise ValueError('Recorded neurons must be in 0..%d' % (layer.N - 1))
+    self.neurons = neurons
+
+    K = layer.N if neurons is None else len(neurons)
+    trials = getattr(layer, 'trials', None)
+    shape = ([trials] if trials else []) + [K]
+    if dtype is None:
+      dtype = getattr(layer, 'dtype', float)
+
+    self.capacity = int(np.ceil(float(T) / interval))
+    self.start = clock
+    self.next = clock
+    self.count = 0
+
+    # Where the samples end up, and the buffer where they are gathered
+    self.data = {}
+    self.buffer = {}
+    self.buffered = 0
+    for name in self.variables:
+      if path is None:
+        self.data[name] = np.zeros([self.capacity] + shape, dtype=dtype)
+      else:
+        self.data[name] = open_memmap('%s_%s.npy' % (path, name), mode='w+',
+                                      dtype=dtype,
+                                      shape=tuple([self.capacity] + shape))
+        self.buffer[name] = np.zeros([min(chunk, self.capacity)] + shape,
+                                     dtype=dtype)
+
+  def Sample(self, clock):
+    """
+    Take a sample if one is due at the end of the given millisecond of the
+    network clock. Called by the network after every update.
+    """
+
+    if clock != self.next or self.count >= self.capacity:
+      return
+    self.next += self.interval
+
+    for name in self.variables:
+      if self.path is None:
+        row = self.data[name][self.count]
+      else:
+        row = self.buffer[name][self.buffered]
+
+      value = getattr(self.layer, name)
+      if self.neurons is None:
+        row[...] = value
+      else:
+        value = np.broadcast_to(value, row.shape[:-1] + (self.layer.N,))
+        np.take(value, self.neurons, axis=-1, out=row, mode='clip')
+
+    self.count += 1
+    if self.path is not None:
+      self.buffered += 1
+      if self.buffered == len(self.buffer[self.variables[0]]):
+        self.Flush()
+
+  def Flush(self):
+    """
+    Write the samples gathered in memory to the files.
+    """
+
+    if self.buffered == 0:
+      return
+
+    first = self.count - self.buffered
+    for name in self.variables:
+      self.data[name][first:self.count] = self.buffer[name][:self.buffered]
+      self.data[name].flush()
+    self.buffered = 0
+
+  def Data(self, name):
+    """
+    Samples of a variable taken so far, as an array (or a memory-mapped
+    array) of shape (samples, neurons), or (samples, trials, neurons) for
+    batched layers. Column k is neurons[k].
+    """
+    self.Flush()
+    return self.data[name][:self.count]
+
+  def Times(self):
+    """
+    Millisecond of the network clock at the end of which each sample was
+    taken. For a recorder created before the first update, sample k of an
+    interval of 1 is the state after net.Update(k).
+    """
+    return self.start + self.interval * np.arange(self.count)
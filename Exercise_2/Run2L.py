@@ -26,10 +26,10 @@ for lr in xrange(len(net.layer)):
   net.layer[lr].u = net.layer[lr].b * net.layer[lr].v
   net.layer[lr].firings = np.array([])
 
-v1 = np.zeros([T, N1])
-v2 = np.zeros([T, N2])
-u1 = np.zeros([T, N1])
-u2 = np.zeros([T, N2])
+## Record v and u of both layers every millisecond. For long runs or large
+## layers, pass neurons, interval and path to record a subsample to disk.
+rec1 = net.Record(0, ('v', 'u'), T=T)
+rec2 = net.Record(1, ('v', 'u'), T=T)
 
 ## SIMULATE
 for t in xrange(T):
@@ -40,10 +40,10 @@ for t in xrange(T):
 
    net.Update(t)
 
-   v1[t] = net.layer[0].v
-   v2[t] = net.layer[1].v
-   u1[t] = net.layer[0].u
-   u2[t] = net.layer[1].u
+v1 = rec1.Data('v')
+v2 = rec2.Data('v')
+u1 = rec1.Data('u')
+u2 = rec2.Data('u')
 
 ## Retrieve firings and add Dirac pulses for presentation
 firings1 = net.layer[0].firings
@@ -6,25 +6,31 @@ Exercise 2
 """
 
 from QIFNetwork import QIFNetwork
+from QIFEventNetwork import QIFEventNetwork
 import numpy as np
 import numpy.random as rn
 
 
-def ConnectQIF2L(N0, N1):
+def ConnectQIF2L(N0, N1, eventDriven=False):
   """
   Constructs two layers of QIF neurons and connects them together.  Pretty much
   like Connect2L, but with QIF instead of Izhikevich neurons. Layers are
   arrays of N neurons.
 
   Inputs:
-  N0, N1 -- Number of neurons in layer 0 and 1, respectively
+  N0, N1      -- Number of neurons in layer 0 and 1, respectively
+  eventDriven -- Simulate with the exact, event-driven QIFEventNetwork
+                 instead of QIFNetwork
   """
 
   F = 60/np.sqrt(N1)  # Scaling factor
   D = 5               # Conduction delay
   Dmax = 10           # Maximum conduction delay
 
-  net = QIFNetwork([N0, N1], Dmax)
+  if eventDriven:
+    net = QIFEventNetwork([N0, N1], Dmax)
+  else:
+    net = QIFNetwork([N0, N1], Dmax)
 
   # Neuron parameters
   # Each layer comprises a heterogenous set of neurons, with a small spread
@@ -0,0 +1,400 @@
+import sys
+sys.path.append('..')
+
+import numpy as np
+from QIFNetwork import QIFNetwork, QIFLayer
+from Synapses import Projection, FanOut
+from SpikeLog import SpikeLog
+
+
+class QIFEventNetwork(QIFNetwork):
+  """
+  Network of quadratic integrate-and-fire neurons simulated with exact,
+  event-driven integration. Drop-in alternative to QIFNetwork in float64.
+
+  Between input events the QIF equation
+
+    tau dv/dt = a*(vr - v)*(vc - v) + R*I
+
+  with x = v - (vr + vc)/2 becomes dx/dt = k*x^2 + c, which has a closed-form
+  solution. Every neuron keeps its state at the time of its last event and
+  the predicted time of its next threshold crossing (v = 30). A neuron is
+  only touched when its input changes or when it fires, so quiet neurons
+  cost nothing, and spike times are exact rather than rounded to an Euler
+  step.
+
+  As in QIFNetwork, a spike delivers a current of F*S[i, j] to its target for
+  1 millisecond after the synaptic delay, but here the pulse starts at the
+  exact spike time plus the delay. The onsets and ends of the pulses are
+  kept in a calendar queue per layer, i.e. a priority queue with one bin per
+  millisecond, sorted when the bin is due. Delays must be at least 1 ms;
+  shorter delays are not delivered. The external current layer[i].I is held
+  constant over each millisecond, and the neuron parameters are assumed not
+  to change during the run.
+  """
+
+  def __init__(self, _neuronsPerLayer, _Dmax, _dtype=float):
+    """
+    Initialise network with given number of neurons. Inputs as in
+    QIFNetwork, except that only float64 is supported: the exact spike
+    times are worked out from differences of absolute times on the network
+    clock, which float32 would round to a few microseconds after a few
+    seconds of simulation.
+    """
+
+    if np.dtype(_dtype) != np.float64:
+      raise ValueError('QIFEventNetwork only supports float64')
+
+    QIFNetwork.__init__(self, _neuronsPerLayer, _Dmax, _dtype)
+
+    for i, n in enumerate(_neuronsPerLayer):
+      self.layer[i] = QIFEventLayer(n)
+
+  def Update(self, t):
+    """
+    Run simulation of the whole network for 1 millisecond and update the
+    network's internal variables.
+
+    Inputs:
+    t -- Current timestep. Spikes are logged at t plus the exact time
+         elapsed within the millisecond.
+    """
+
+    # Spikes emitted in this millisecond only have effects after the end of
+    # it, so the layers can be advanced independently of each other
+    for lr in xrange(self.Nlayers):
+      self.NeuronUpdate(lr, t)
+
+    self.clock += 1
+    self.Monitor()
+
+  def NeuronUpdate(self, i, t):
+    """
+    Advance one layer for 1 millisecond. The input events of the millisecond
+    are taken in rounds (the first event of every neuron, then the second
+    one...), so the work is vectorised across neurons.
+
+    Inputs:
+    i -- Number of layer to update
+    t -- Current timestep, used to timestamp the spikes
+    """
+
+    lay = self.layer[i]
+    start = float(self.clock)
+    end = start + 1
+    spikes = []
+
+    # Neurons whose external current has changed
+    I = lay.I * np.ones(lay.N)
+    changed = np.nonzero(I != lay.Iext)[0]
+    if lay.reset:
+      lay.Compile()
+      changed = np.arange(lay.N)
+      lay.reset = False
+    lay.Advance(changed, start)
+    lay.Iext[changed] = I[changed]
+    lay.Predict(changed)
+
+    # Events due in this millisecond, sorted by neuron and then by time
+    due = lay.calendar.pop(self.clock, [])
+    if due:
+      times, rows, amount = [np.concatenate(e) for e in zip(*due)]
+      order = np.lexsort((times, rows))
+      times, rows, amount = times[order], rows[order], amount[order]
+
+      # Rank of each event among the events of its neuron
+      first = np.r_[True, rows[1:] != rows[:-1]]
+      head = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+      rank = np.arange(len(rows)) - head
+
+      for r in xrange(rank.max() + 1):
+        sel = rank == r
+        self.Fire(i, rows[sel], times[sel], spikes)
+        lay.Advance(rows[sel], times[sel])
+        lay.Isyn[rows[sel]] += amount[sel]
+        lay.Predict(rows[sel])
+
+    self.Fire(i, np.nonzero(lay.crossing < end)[0], end, spikes)
+    lay.now = end
+
+    # Log the spikes in time order
+    if spikes:
+      times, neurons = [np.concatenate(s) for s in zip(*spikes)]
+      order = np.argsort(times, kind='mergesort')
+      lay.LogSpikes(t, neurons[order])
+      lay.exactSpikes.Append(t + times[order] - start, neurons[order])
+
+  def Fire(self, i, idx, until, spikes):
+    """
+    Emit the spikes of neurons idx of layer i that reach threshold before
+    time until, resetting them and predicting their next crossing, until
+    none of them reaches threshold again.
+
+    Inputs:
+    i      -- Number of the layer
+    idx    -- Indices of the neurons to check
+    until  -- Time, or one time per neuron, to check up to
+    spikes -- List where (times, neurons) arrays of spikes are appended
+    """
+
+    lay = self.layer[i]
+    until = np.asarray(until) * np.ones(len(idx))
+
+    fire = lay.crossing[idx] < until
+    idx, until = idx[fire], until[fire]
+
+    while len(idx) > 0:
+      ts = lay.crossing[idx]
+      spikes.append((ts, idx))
+      self.QueueSpikes(i, idx, ts)
+
+      lay.vn[idx] = lay.vreset[idx]
+      lay.tn[idx] = ts
+      lay.Predict(idx)
+
+      fire = lay.crossing[idx] < until
+      idx, until = idx[fire], until[fire]
+
+  def QueueSpikes(self, j, fired, ts):
+    """
+    Queue the synaptic current pulses caused by spikes of neurons of layer j.
+
+    Inputs:
+    j     -- Number of the layer whose neurons have fired
+    fired -- Indices of the neurons that have fired
+    ts    -- Times of the spikes on the network clock
+    """
+
+    for i in xrange(self.Nlayers):
+      if j not in self.layer[i].S:
+        continue
+
+      table = self.GetTable(i, j)
+      F = self.layer[i].factor[j]
+
+      syn = FanOut(table.indptr, fired)
+      counts = table.indptr[fired + 1] - table.indptr[fired]
+      if table.lag is None:
+        lag = table.uniformLag
+      else:
+        lag = table.lag[syn]
+
+      onset  = np.repeat(ts, counts) + lag
+      rows   = table.indices[syn]
+      amount = F * table.weight[syn]
+
+      self.Push(i, onset, rows, amount)
+      self.Push(i, onset + 1, rows, -amount)
+
+  def Push(self, i, times, rows, amount):
+    """
+    Add events changing the synaptic current of neurons rows of layer i at
+    the given times to the calendar of layer i.
+    """
+
+    calendar = self.layer[i].calendar
+    bins = np.floor(times).astype(int)
+
+    for b in np.unique(bins):
+      sel = bins == b
+      calendar.setdefault(b, []).append((times[sel], rows[sel], amount[sel]))
+
+  def GetTable(self, i, j):
+    """
+    Fan-out table of the projection from layer j to layer i, compiled again
+    if layer[i].S[j] or layer[i].delay[j] have been replaced, or
+    Network.Recompile has been called.
+    """
+
+    lay = self.layer[i]
+    table = lay.projection.get(j)
+
+    if table is None or not table.Matches(lay.S[j], lay.delay[j]):
+      table = Projection(lay.S[j], lay.delay[j], self.Dmax,
+                         (lay.N, self.layer[j].N), False)
+      lay.projection[j] = table
+
+    return table
+
+
+class QIFEventLayer(QIFLayer):
+  """
+  Layer of quadratic integrate-and-fire neurons to be used inside a
+  QIFEventNetwork.
+  """
+
+  def __init__(self, n):
+    """
+    Initialise layer with empty vectors. Besides firings, the exact spike
+    times are logged in exactSpikes, and read as exact.
+    Pending changes of the synaptic current Isyn are queued in calendar,
+    which maps each millisecond of the network clock to a list of
+    (times, target neurons, changes) arrays due in it.
+
+    Each neuron's potential is only known at the time tn of its last event,
+    as vn; v is worked out from them when it is read.
+
+    Inputs:
+    n -- Number of neurons in the layer
+    """
+
+    QIFLayer.__init__(self, n)
+
+    self.I     = np.zeros(n)
+    self.Iext  = np.zeros(n)
+    self.Isyn  = np.zeros(n)
+    self.exactSpikes = SpikeLog(dtype=float)
+
+    self.calendar = {}
+
+    self.now      = 0.0
+    self.vn       = np.zeros(n)
+    self.tn       = np.zeros(n)
+    self.crossing = np.inf * np.ones(n)
+
+    # Whether v has been assigned, so that the parameters have to be compiled
+    # and all the predictions are out of date. The parameters are taken as
+    # they are at the first update after v is assigned.
+    self.reset = True
+
+  @property
+  def v(self):
+    """
+    Membrane potentials at the time the layer has been simulated up to.
+    Assigning to v (a scalar or one value per neuron) sets the state of all
+    the neurons at that time.
+    """
+
+    if self.reset:
+      return self.vn.copy()
+
+    m, xt, k, c = self.Model(np.arange(self.N))
+    return m + Evolve(self.vn - m, k, c, self.now - self.tn)
+
+  @v.setter
+  def v(self, value):
+    self.vn = value * np.ones(self.N)
+    self.tn = self.now * np.ones(self.N)
+    self.reset = True
+
+  @property
+  def exact(self):
+    """
+    Exact spike times of the layer as a (K, 2) array of [time, index of the
+    neuron] rows, with time in ms. Assigning an array replaces the contents
+    of the log, as with firings.
+    """
+    return self.exactSpikes.Array()
+
+  @exact.setter
+  def exact(self, value):
+    self.exactSpikes.Load(value)
+
+  def Compile(self):
+    """
+    Work out the parameters of every neuron after the change of variables
+    x = v - m, under which tau dv/dt = a*(vr - v)*(vc - v) + R*I becomes
+    dx/dt = k*x^2 + g*I + c0.
+    """
+
+    ones = np.ones(self.N)
+    vr, vc = self.vr * ones, self.vc * ones
+    a, tau, R = self.a * ones, self.tau * ones, self.R * ones
+
+    # A neuron reset at or above threshold would fire again at once, forever
+    if np.any(vr >= 30):
+      raise ValueError('The reset potential vr must be below the threshold '
+                       'of 30 mV')
+
+    h = (vc - vr) / 2.0
+    self.m  = (vr + vc) / 2.0
+    self.vreset = vr
+    self.xt = 30 - self.m
+    self.k  = a / tau
+    self.g  = R / tau
+    self.c0 = -a * h * h / tau
+
+  def Model(self, idx):
+    """
+    Parameters of neurons idx under the change of variables to
+    dx/dt = k*x^2 + c, given their current input.
+
+    Outputs:
+    m, xt, k, c -- Offset, threshold in x, and coefficients
+    """
+
+    c = self.g[idx] * (self.Iext[idx] + self.Isyn[idx]) + self.c0[idx]
+    return self.m[idx], self.xt[idx], self.k[idx], c
+
+  def Advance(self, idx, until):
+    """
+    Advance neurons idx to time until (one per neuron or a scalar), which
+    must come before their next threshold crossing.
+    """
+
+    m, xt, k, c = self.Model(idx)
+    dt = until - self.tn[idx]
+    self.vn[idx] = m + Evolve(self.vn[idx] - m, k, c, dt * np.ones(len(idx)))
+    self.tn[idx] = until
+
+  def Predict(self, idx):
+    """
+    Work out the next threshold crossing of neurons idx, given their input.
+    """
+
+    m, xt, k, c = self.Model(idx)
+    dt = CrossingTime(self.vn[idx] - m, xt, k, c)
+    self.crossing[idx] = self.tn[idx] + dt
+
+
+def CrossingTime(x, xt, k, c):
+  """
+  Time it takes the solution of dx/dt = k*x^2 + c (k > 0) to go from x to
+  the threshold xt > x, or infinity if it never gets there.
+  """
+
+  T = np.inf * np.ones(len(x))
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # c > 0: x runs off to infinity along a tangent
+    s = np.sqrt(np.abs(c) / k)
+    pos = c > 0
+    T[pos] = ((np.arctan(xt[pos]/s[pos]) - np.arctan(x[pos]/s[pos])) /
+              (k[pos]*s[pos]))
+
+    # c < 0: only neurons above the unstable fixed point x = s fire
+    neg = (c < 0) & (x > s)
+    q  = (x[neg] - s[neg]) / (x[neg] + s[neg])
+    qt = (xt[neg] - s[neg]) / (xt[neg] + s[neg])
+    T[neg] = np.log(qt/q) / (2*k[neg]*s[neg])
+
+    # c = 0: x = x0/(1 - k*x0*t)
+    zero = (c == 0) & (x > 0)
+    T[zero] = (1/x[zero] - 1/xt[zero]) / k[zero]
+
+  T[x >= xt] = 0
+  return T
+
+
+def Evolve(x, k, c, t):
+  """
+  Solution of dx/dt = k*x^2 + c after time t, starting from x. Assumes it
+  does not run off to infinity within t, see CrossingTime.
+  """
+
+  y = np.zeros(len(x))
+  s = np.sqrt(np.abs(c) / k)
+
+  pos = c > 0
+  y[pos] = s[pos] * np.tan(np.arctan(x[pos]/s[pos]) + k[pos]*s[pos]*t[pos])
+
+  neg = c < 0
+  E = np.exp(2*k[neg]*s[neg]*t[neg])
+  a = x[neg] + s[neg]
+  b = x[neg] - s[neg]
+  y[neg] = s[neg] * (a + b*E) / (a - b*E)
+
+  zero = c == 0
+  y[zero] = x[zero] / (1 - k[zero]*x[zero]*t[zero])
+
+  return y
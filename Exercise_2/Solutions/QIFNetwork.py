@@ -1,12 +1,17 @@
+import sys
+sys.path.append('..')
+
 import numpy as np
+from Network import Network, Layer
 
 
-class QIFNetwork:
+class QIFNetwork(Network):
   """
-  Network of quadratic integrate-and-fire neurons.
+  Network of quadratic integrate-and-fire neurons. A Network whose layers
+  are all QIFLayer.
   """
 
-  def __init__(self, _neuronsPerLayer, _Dmax):
+  def __init__(self, _neuronsPerLayer, _Dmax, _dtype=float):
     """
     Initialise network with given number of neurons
 
@@ -17,116 +22,70 @@ class QIFNetwork:
 
     _Dmax            -- Maximum delay in all the synapses in the network. Any
                         longer delay will result in failing to deliver spikes.
+
+    _dtype           -- Floating point type of the state variables, the
+                        parameters and the synaptic weights, as in IzNetwork
     """
 
-    self.Dmax = _Dmax
-    self.Nlayers = len(_neuronsPerLayer)
+    Network.__init__(self, [QIFLayer(n, _dtype) for n in _neuronsPerLayer],
+                     _Dmax, None, _dtype)
 
-    self.layer = {}
 
-    for i, n in enumerate(_neuronsPerLayer):
-      self.layer[i] = QIFLayer(n)
+class QIFLayer(Layer):
+  """
+  Layer of quadratic integrate-and-fire neurons, integrated with the Euler
+  method.
+  """
 
-  def Update(self, t):
-    """
-    Run simulation of the whole network for 1 millisecond and update the
-    network's internal variables.
+  stateVariables = ('v',)
 
-    Inputs:
-    t -- Current timestep. Necessary to sort out the synaptic delays.
-    """
-    for lr in xrange(self.Nlayers):
-      self.NeuronUpdate(lr, t)
+  # State variables and parameters, kept in the dtype of the layer
+  variables = ('v', 'I', 'R', 'tau', 'vr', 'vc', 'a')
 
-  def NeuronUpdate(self, i, t):
+  def __init__(self, n, dtype=float):
     """
-    QIF neuron update function. Update one layer for 1 millisecond
-    using the Euler method.
-
-    Inputs:
-    i -- Number of layer to update
-    t -- Current timestep. Necessary to sort out the synaptic delays.
+    Initialise layer with empty vectors. Inputs as in Layer.
     """
 
-    # Euler method step size in ms
-    dt = 0.2
-
-    # Calculate current from incoming spikes
-    for j in xrange(self.Nlayers):
-
-      # If layer[i].S[j] exists then layer[i].factor[j] and
-      # layer[i].delay[j] have to exist
-      if j in self.layer[i].S:
-        S = self.layer[i].S[j]  # target neuron->rows, source neuron->columns
-
-        # Firings contains time and neuron idx of each spike.
-        # [t, index of the neuron in the layer j]
-        firings = self.layer[j].firings
-
-        # Find incoming spikes taking delays into account
-        delay = self.layer[i].delay[j]
-        F = self.layer[i].factor[j]
-
-        # Sum current from incoming spikes
-        k = len(firings)
-        while k > 0 and (firings[k-1, 0] > (t - self.Dmax)):
-          idx = delay[:, firings[k-1, 1]] == (t-firings[k-1, 0])
-          self.layer[i].I[idx] += F * S[idx, firings[k-1, 1]]
-          k = k-1
-
-    # Update v using the QIF equations and Euler method
-    for k in xrange(int(1/dt)):
-      v = self.layer[i].v   #why is this initialised to a scalar not an array?
-
-      self.layer[i].v += dt*(
-          self.layer[i].a*(self.layer[i].vr - v)*(self.layer[i].vc - v) +
-          self.layer[i].R*self.layer[i].I) / self.layer[i].tau
-
-      # Find index of neurons that have fired this millisecond
-      fired = np.where(self.layer[i].v >= 30)[0]
-
-      if len(fired) > 0:
-        for f in fired:
-          # Add spikes into spike train
-          if len(self.layer[i].firings) != 0:
-            self.layer[i].firings = np.vstack([self.layer[i].firings, [t, f]])
-          else:
-            self.layer[i].firings = np.array([[t, f]])
+    Layer.__init__(self, n, None, dtype)
 
+    self.R   = np.zeros(n)
+    self.tau = np.zeros(n)
+    self.vr  = np.zeros(n)
+    self.vc  = np.zeros(n)
+    self.a   = np.zeros(n)
 
-          #?????????
-          # Reset the membrane potential after spikes
-          # Here's a little hack to see if vr is array or scalar
-          if hasattr(self.layer[i].vr, "__len__"):
-            self.layer[i].v[f]  = self.layer[i].vr[f]
-          else:
-            self.layer[i].v[f]  = self.layer[i].vr
+    # Euler method step size in ms
+    self.dt = 0.2
 
-    return
+  def Step(self):
+    """
+    Advance v by one Euler step of the QIF equation.
+    """
 
+    # v may still be the scalar the scripts start it off as
+    v = self.v
 
-class QIFLayer:
-  """
-  Layer of quadratic integrate-and-fire neurons to be used inside an
-  QIFNetwork.
-  """
+    self.v += self.dt*(self.a*(self.vr - v)*(self.vc - v) +
+                       self.R*self.I) / self.tau
 
-  def __init__(self, n):
+  def Threshold(self, t):
     """
-    Initialise layer with empty vectors.
-
-    Inputs:
-    n -- Number of neurons in the layer
+    Neurons at or above the peak of the spike, 30 mV.
     """
+    return np.where(self.v >= 30)
 
-    self.N   = n
-    self.R   = np.zeros(n)
-    self.tau = np.zeros(n)
-    self.vr  = np.zeros(n)
-    self.vc  = np.zeros(n)
-    self.a   = np.zeros(n)
-
-    self.S      = {}
-    self.delay  = {}
-    self.factor = {}
-
+  def Reset(self, fired):
+    """
+    Reset the membrane potential after spikes. vr is read at every reset,
+    so it can be a scalar or one value per neuron, and can be changed in
+    place.
+    """
+    self.v[fired] = np.broadcast_to(self.vr, np.shape(self.v))[fired]
+
+  def __setattr__(self, name, value):
+    # State variables and parameters are kept in the dtype of the layer.
+    # Scalars stay scalars, as the scripts may start v off as one.
+    if name in QIFLayer.variables:
+      value = self.Cast(value)
+    object.__setattr__(self, name, value)
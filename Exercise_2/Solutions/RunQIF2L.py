@@ -18,7 +18,12 @@ N2 = 4
 T  = 500  # Simulation time
 Ib = 15   # Base current
 
-net = ConnectQIF2L(N1, N2)
+# Set to True to integrate the neurons exactly between spikes (see
+# QIFEventNetwork). net.layer[lr].exact then holds the exact spike times, as
+# [time, neuron] rows like net.layer[lr].firings.
+EventDriven = False
+
+net = ConnectQIF2L(N1, N2, EventDriven)
 
 ## Initialise layers
 for lr in xrange(len(net.layer)):
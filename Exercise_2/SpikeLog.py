@@ -0,0 +1,187 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Spike log kept behind layer.firings in IzNetwork, QIFNetwork and HhNetwork.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import numpy as np
+
+
+class SpikeLog:
+  """
+  Growable record of spikes as [t, index of the neuron] rows, or
+  [t, index of the neuron, trial] rows for batched networks. Storage grows
+  geometrically, so appending K spikes costs O(K) overall instead of the
+  O(K^2) of stacking one row at a time.
+  """
+
+  def __init__(self, capacity=1024, dtype=int, columns=2):
+    """
+    Initialise an empty log.
+
+    Inputs:
+    capacity -- Number of spikes to allocate room for initially
+    dtype    -- Type of the entries. Use float to log exact spike times.
+    columns  -- 2 for [t, neuron] rows, 3 for [t, neuron, trial] rows
+    """
+
+    self.data  = np.zeros([capacity, columns], dtype=dtype)
+    self.count = 0
+
+  def __len__(self):
+    return self.count
+
+  def Append(self, t, neurons, trials=None):
+    """
+    Add a batch of spikes, usually of several neurons that fired together.
+
+    Inputs:
+    t       -- Time of the spikes, or an array with one time per neuron
+    neurons -- Indices of the neurons that fired
+    trials  -- Trial of each spike, for logs with a trial column
+    """
+
+    n = len(neurons)
+    self.Reserve(self.count + n)
+
+    self.data[self.count:self.count+n, 0] = t
+    self.data[self.count:self.count+n, 1] = neurons
+    if trials is not None:
+      self.data[self.count:self.count+n, 2] = trials
+    self.count += n
+
+  def Reserve(self, capacity):
+    """
+    Make sure there is room for at least the given number of spikes,
+    doubling the storage as many times as needed.
+    """
+
+    if capacity > len(self.data):
+      size = max(len(self.data), 1)
+      while size < capacity:
+        size *= 2
+
+      data = np.zeros([size, self.data.shape[1]], dtype=self.data.dtype)
+      data[:self.count] = self.data[:self.count]
+      self.data = data
+
+  def Array(self):
+    """
+    The spikes logged so far as a (K, 2) array of [t, neuron] rows, or
+    (K, 3) with a trial column. This is a view into the log, not a copy.
+    """
+    return self.data[:self.count]
+
+  def Load(self, firings):
+    """
+    Replace the contents of the log with the given spikes. An empty array
+    or list clears the log.
+
+    Inputs:
+    firings -- Array-like of [t, neuron] rows, or [t, neuron, trial] rows
+    """
+
+    firings = np.asarray(firings, dtype=self.data.dtype)
+    firings = firings.reshape(-1, self.data.shape[1])
+
+    self.count = 0
+    self.Reserve(len(firings))
+    self.data[:len(firings)] = firings
+    self.count = len(firings)
+
+
+class SpikeWindow:
+  """
+  Spike log that only keeps the spikes of the last few milliseconds of the
+  network clock, with the interface of SpikeLog. Older spikes are passed on
+  to a sink, or dropped, so that memory does not grow with the length of
+  the run. See Network.RetainSpikes.
+  """
+
+  def __init__(self, window, sink=None, dtype=int, columns=2, clock=0):
+    """
+    Initialise an empty log.
+
+    Inputs:
+    window  -- Number of milliseconds of spikes to keep
+    sink    -- Where older spikes go: anything with the Append method of
+               SpikeLog, e.g. a SpikeLog (in-memory archive) or a
+               SpikeStore (file), or None to drop them
+    dtype   -- Type of the entries, as in SpikeLog
+    columns -- 2 for [t, neuron] rows, 3 for [t, neuron, trial] rows
+    clock   -- Current clock of the network
+    """
+
+    self.window = window
+    self.sink = sink
+    self.clock = clock
+
+    # The spikes kept are rows start to start + count of log, logged in the
+    # milliseconds of the network clock in stamp
+    self.log = SpikeLog(dtype=dtype, columns=columns)
+    self.stamp = np.zeros(len(self.log.data), dtype=int)
+    self.start = 0
+
+  def __len__(self):
+    return self.log.count - self.start
+
+  def Append(self, t, neurons, trials=None):
+    """
+    Add a batch of spikes, as in SpikeLog.Append.
+    """
+
+    self.log.Append(t, neurons, trials)
+    if len(self.stamp) < len(self.log.data):
+      stamp = np.zeros(len(self.log.data), dtype=int)
+      stamp[:len(self.stamp)] = self.stamp
+      self.stamp = stamp
+    self.stamp[self.log.count - len(neurons):self.log.count] = self.clock
+
+  def Expire(self, clock):
+    """
+    Move the spikes older than the window out to the sink. Called by the
+    network after every update with its clock, the number of the next
+    millisecond.
+    """
+
+    self.clock = clock
+
+    count = self.log.count
+    end = self.start + np.searchsorted(self.stamp[self.start:count],
+                                       clock - self.window)
+    if end > self.start:
+      if self.sink is not None:
+        old = self.log.data[self.start:end]
+        self.sink.Append(old[:, 0], old[:, 1],
+                         old[:, 2] if old.shape[1] == 3 else None)
+      self.start = end
+
+    # Move the spikes kept to the front once the expired ones take up most
+    # of the storage, so that it stays bounded
+    if self.start > 0 and self.start >= len(self.log.data) // 2:
+      n = count - self.start
+      self.log.data[:n] = self.log.data[self.start:count]
+      self.stamp[:n] = self.stamp[self.start:count]
+      self.log.count = n
+      self.start = 0
+
+  def Array(self):
+    """
+    The spikes of the window as a (K, 2) array of [t, neuron] rows, or
+    (K, 3) with a trial column. This is a view into the log, not a copy.
+    """
+    return self.log.data[self.start:self.log.count]
+
+  def Load(self, firings):
+    """
+    Replace the contents of the log with the given spikes, as in
+    SpikeLog.Load. They count as logged in the current millisecond.
+    """
+
+    self.log.Load(firings)
+    self.start = 0
+    self.stamp = np.zeros(len(self.log.data), dtype=int)
+    self.stamp[:self.log.count] = self.clock
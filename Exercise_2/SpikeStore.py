@@ -0,0 +1,221 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+On-disk spike store, a drop-in replacement for the SpikeLog of a layer for
+long runs (see Network.StoreSpikes). The spikes are kept as columns of a
+compact binary type, one file per column:
+
+  <path>_t.bin       Times
+  <path>_neuron.bin  Indices of the neurons
+  <path>_trial.bin   Trials, for batched layers only
+
+Spikes are gathered in memory and appended to the files chunk spikes at a
+time, so memory use does not grow with the length of the run. The files
+are only ever appended to, one column after the other, and ReadSpikes only
+takes the spikes present in all the columns, so the chunks completed so far
+can be analysed while the simulation is still running. Spikes still in
+memory when a run ends without Network.FlushSpikes are lost.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import os
+import numpy as np
+
+COLUMNS = ('t', 'neuron', 'trial')
+
+
+class SpikeStore:
+  """
+  Spike log backed by files, with the interface of SpikeLog.
+  """
+
+  def __init__(self, path, chunk=65536, dtype=np.int32, columns=2):
+    """
+    Create an empty store, truncating any files already at path.
+
+    Inputs:
+    path    -- Prefix of the files
+    chunk   -- Number of spikes gathered in memory before they are written
+    dtype   -- Type of the entries. Use float to store exact spike times.
+    columns -- 2 for [t, neuron] rows, 3 for [t, neuron, trial] rows
+    """
+
+    self.path = path
+    self.dtype = np.dtype(dtype)
+    self.columns = columns
+
+    self.buffer = np.zeros([columns, chunk], dtype=self.dtype)
+    self.buffered = 0
+    self.written = 0
+
+    self.Truncate()
+
+  def __len__(self):
+    return self.written + self.buffered
+
+  def Append(self, t, neurons, trials=None):
+    """
+    Add a batch of spikes, as in SpikeLog.Append.
+    """
+
+    n = len(neurons)
+    while n > 0:
+      k = min(n, self.buffer.shape[1] - self.buffered)
+      s = slice(self.buffered, self.buffered + k)
+
+      self.buffer[0, s] = t if np.ndim(t) == 0 else t[:k]
+      self.buffer[1, s] = neurons[:k]
+      if trials is not None:
+        self.buffer[2, s] = trials[:k]
+      self.buffered += k
+
+      if self.buffered == self.buffer.shape[1]:
+        self.Flush()
+
+      if np.ndim(t) > 0:
+        t = t[k:]
+      neurons = neurons[k:]
+      if trials is not None:
+        trials = trials[k:]
+      n -= k
+
+  def Flush(self):
+    """
+    Append the spikes gathered in memory to the files.
+    """
+
+    if self.buffered == 0:
+      return
+
+    for c in xrange(self.columns):
+      with open(ColumnPath(self.path, c), 'ab') as f:
+        self.buffer[c, :self.buffered].tofile(f)
+
+    self.written += self.buffered
+    self.buffered = 0
+
+  def Truncate(self):
+    """
+    Empty the store and its files.
+    """
+
+    for c in xrange(self.columns):
+      open(ColumnPath(self.path, c), 'wb').close()
+
+    self.buffered = 0
+    self.written = 0
+
+  def __setstate__(self, state):
+    # Restored from a checkpoint (see Network.SaveCheckpoint): spikes
+    # written to the files after the checkpoint was saved are cut off, and
+    # the ones that were still in memory are in buffer. Files that lack
+    # spikes of the checkpoint, e.g. truncated by StoreSpikes, cannot be
+    # restored, and are never padded.
+    self.__dict__.update(state)
+
+    size = self.written * self.dtype.itemsize
+    for c in xrange(self.columns):
+      f = ColumnPath(self.path, c)
+      if not os.path.exists(f) or os.path.getsize(f) < size:
+        raise ValueError('%s lacks spikes written before the checkpoint was '
+                         'saved. Load the checkpoint before calling '
+                         'StoreSpikes.' % f)
+
+    for c in xrange(self.columns):
+      with open(ColumnPath(self.path, c), 'r+b') as f:
+        f.truncate(size)
+
+  def __deepcopy__(self, memo):
+    # A copy appending to the same files would interleave its spikes with
+    # the ones of the original (see Network.Fork)
+    return DetachedStore(self.path, self.dtype, self.columns)
+
+  def Array(self):
+    """
+    The spikes stored so far as a (K, 2) array of [t, neuron] rows, or
+    (K, 3) with a trial column, read back from the files.
+    """
+    self.Flush()
+    return ReadSpikes(self.path, self.dtype, self.columns)
+
+  def Load(self, firings):
+    """
+    Replace the contents of the store with the given spikes, as in
+    SpikeLog.Load.
+    """
+
+    firings = np.asarray(firings, dtype=self.dtype)
+    firings = firings.reshape(-1, self.columns)
+
+    self.Truncate()
+    self.Append(firings[:, 0], firings[:, 1],
+                firings[:, 2] if self.columns == 3 else None)
+
+
+class DetachedStore:
+  """
+  Stand-in for the SpikeStore of a copy of a network, which has no files of
+  its own. Logging or reading spikes fails until the copy is given new
+  stores with Network.StoreSpikes.
+  """
+
+  def __init__(self, path, dtype, columns):
+    self.path = path
+    self.dtype = dtype
+    self.columns = columns
+
+  def __len__(self):
+    return 0
+
+  def Detached(self, *args, **kwargs):
+    raise ValueError('This copy of the network has no files for its spikes '
+                     'and still refers to %s. Call StoreSpikes on it with a '
+                     'new path.' % self.path)
+
+  Append = Flush = Array = Load = Detached
+
+
+def Logged(log):
+  """
+  The spikes logged so far by a SpikeLog, SpikeWindow or SpikeStore, or none
+  for a DetachedStore, whose spikes are in the files of the original.
+  """
+  if isinstance(log, DetachedStore):
+    return np.zeros((0, log.columns), dtype=log.dtype)
+  return log.Array()
+
+
+def ColumnPath(path, c):
+  """
+  Name of the file of column c of the store at path.
+  """
+  return '%s_%s.bin' % (path, COLUMNS[c])
+
+
+def ReadColumns(path, dtype=np.int32, columns=2):
+  """
+  Memory-map the columns of the store at path, without copying them.
+
+  Outputs:
+  List of one array per column, of equal length: the spikes completed in
+  every column so far
+  """
+
+  dtype = np.dtype(dtype)
+  files = [ColumnPath(path, c) for c in xrange(columns)]
+  K = min(os.path.getsize(f) for f in files) // dtype.itemsize
+
+  if K == 0:
+    return [np.zeros(0, dtype=dtype) for f in files]
+  return [np.memmap(f, dtype=dtype, mode='r', shape=(K,)) for f in files]
+
+
+def ReadSpikes(path, dtype=np.int32, columns=2):
+  """
+  Read the store at path back in the layout of layer.firings: a (K, 2)
+  array of [t, neuron] rows, or (K, 3) with a trial column. This works
+  while the store is still being written, see ReadColumns.
+  """
+  return np.column_stack(ReadColumns(path, dtype, columns))
@@ -0,0 +1,90 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Analysis of the spike trains in layer.firings: spike counts in bins, and
+population firing rates over sliding windows. Both take every spike once,
+instead of testing all the spikes against every bin or window, so a run of
+seconds with a million spikes is analysed in milliseconds.
+
+The functions take the firings of one layer, or a list of the firings of
+several layers, which gives one row of results per layer.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import numpy as np
+
+
+def BinCounts(firings, T, binSize=1, start=0):
+  """
+  Number of spikes in consecutive bins of binSize ms, from start to T.
+
+  Inputs:
+  firings -- layer.firings, rows of [t, neuron] or [t, neuron, trial], with
+             integer or exact spike times, or a list of them
+  T       -- End of the last bin in ms
+  binSize -- Width of the bins in ms
+  start   -- Start of the first bin in ms
+
+  Outputs:
+  Array of ceil((T-start)/binSize) counts, bin k covering
+  start+k*binSize <= t < start+(k+1)*binSize, or one row per layer. Spikes
+  outside the bins are left out.
+  """
+
+  if isinstance(firings, list):
+    return np.array([BinCounts(f, T, binSize, start) for f in firings])
+
+  bins = int(np.ceil((T - start) / float(binSize)))
+  times = SpikeTimes(firings)
+
+  k = ((times - start) // binSize).astype(int)
+  k = k[(k >= 0) & (k < bins)]
+
+  return np.bincount(k, minlength=bins)
+
+
+def MovingRate(firings, N, T, ws=10, ds=1, start=0):
+  """
+  Mean firing rate of a population in Hz, over sliding windows of ws ms
+  ending every ds ms, as plotted by Sync2Run. The window ending at time j
+  holds the spikes with j-ws <= t < j.
+
+  Inputs:
+  firings -- layer.firings, or a list of the firings of several layers
+  N       -- Number of neurons of the population the rate is averaged over,
+             or one number per layer
+  T       -- End of the run in ms. The last window ends before T.
+  ws      -- Window size in ms
+  ds      -- Step between the ends of consecutive windows in ms
+  start   -- End of the first window in ms
+
+  Outputs:
+  Array of the rates of the windows ending at start, start+ds, ... < T, or
+  one row per layer
+  """
+
+  if isinstance(firings, list):
+    N = np.broadcast_to(N, [len(firings)])
+    return np.array([MovingRate(f, n, T, ws, ds, start)
+                     for f, n in zip(firings, N)])
+
+  # Number of spikes before the end of every window minus before its start
+  times = np.sort(SpikeTimes(firings))
+  ends = np.arange(start, T, ds)
+  counts = (np.searchsorted(times, ends, 'left') -
+            np.searchsorted(times, ends - ws, 'left'))
+
+  return counts * 1000.0/(ws*N)
+
+
+def SpikeTimes(firings):
+  """
+  Times of the spikes in layer.firings, which may be empty.
+  """
+
+  firings = np.asarray(firings)
+  if firings.size == 0:
+    return np.zeros(0)
+  return firings[:, 0]
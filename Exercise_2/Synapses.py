@@ -0,0 +1,573 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Synaptic delivery of the Network engine (see Network.py), shared by the
+layers of every neuron model.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import copy
+import numpy as np
+import scipy.sparse as sp
+import Kernels
+
+
+class Projection:
+  """
+  Connections from a source layer j to a target layer i, compiled from
+  layer[i].S[j] and layer[i].delay[j] into a column-wise (per presynaptic
+  neuron) fan-out table, together with a circular input buffer of depth Dmax
+  for the target layer. For batched networks the buffer holds one row of
+  input per trial.
+
+  The weights are kept in the dtype of the network, while the buffer is
+  always float64, since every slot accumulates the contributions of many
+  spikes.
+  """
+
+  mode = 'ring'
+
+  # Set by Network.Recompile when S or delay were changed in place
+  stale = False
+
+  # Attributes that make up the connectivity, shared by forks of the
+  # network (see Network.Fork)
+  connectivity = ('S', 'delay', 'indptr', 'indices', 'weight', 'lag')
+
+  def __init__(self, S, delay, Dmax, shape, zeroDelay, trials=None,
+               dtype=float):
+    """
+    Compile the fan-out table of a projection.
+
+    Inputs:
+    S         -- Connectivity matrix, target neuron->rows, source
+                 neuron->columns. Either a dense array, a scipy.sparse
+                 matrix in any format, or a scalar for all-to-all connections
+                 of equal weight.
+    delay     -- Conduction delays with the same shape as S. Dense or sparse;
+                 a sparse delay matrix only needs entries where S is nonzero.
+                 A scalar gives every synapse the same delay.
+    Dmax      -- Depth of the circular buffer. Synapses with a delay of Dmax
+                 or longer are dropped, since they can never be delivered.
+    shape     -- Number of neurons in the target and source layers
+    zeroDelay -- Whether synapses with a delay of zero can be delivered, i.e.
+                 whether the target layer is updated after the source layer.
+    trials    -- Number of trials of a batched network, or None
+    dtype     -- Floating point type of the weights
+    """
+
+    self.S     = S
+    self.delay = delay
+    self.Dmax  = Dmax
+
+    if np.isscalar(S):
+      S = S * np.ones(shape)
+
+    # A copy, since S may be shared read-only with forks of the network
+    W = sp.csc_matrix(S, copy=True)
+    W.eliminate_zeros()
+    W.sort_indices()
+
+    # Source neuron of every synapse, to look up the matching delays. With a
+    # uniform delay there is no need to keep one delay per synapse.
+    cols = np.repeat(np.arange(W.shape[1]), np.diff(W.indptr))
+    if IsUniform(delay):
+      self.uniformLag = int(np.asarray(delay).flat[0])
+    else:
+      self.uniformLag = None
+    lag = SynapseDelays(delay, W.indices, cols)
+
+    keep = (lag < Dmax) & (lag >= (0 if zeroDelay else 1))
+    counts = np.bincount(cols[keep], minlength=W.shape[1])
+
+    self.indptr  = np.concatenate([[0], np.cumsum(counts)])
+    self.indices = W.indices[keep]
+    self.weight  = W.data[keep].astype(dtype)
+    self.lag     = lag[keep] if self.uniformLag is None else None
+
+    self.buffer = np.zeros([Dmax] + TrialShape(trials) + [shape[0]])
+
+    # Scratch space where ScatterBlock sums the input of each step
+    self.scratch = (np.zeros(shape[0]), np.zeros(shape[0], dtype=int),
+                    np.zeros(shape[0], dtype=bool))
+
+  def Connectivity(self):
+    """
+    The objects that make up the connectivity of the projection, as
+    opposed to the spikes in flight.
+    """
+    return [getattr(self, name) for name in self.connectivity
+            if hasattr(self, name)]
+
+  def Matches(self, S, delay):
+    """
+    Whether this projection was compiled from the given S and delay objects,
+    and has not been marked stale since.
+    """
+    return not self.stale and self.S is S and self.delay is delay
+
+  def Scatter(self, fired, clock, F, trials=None):
+    """
+    Add the contributions of the spikes of the given source neurons into the
+    buffer slots of their arrival times.
+
+    Inputs:
+    fired  -- Indices of the source neurons that have fired
+    clock  -- Current value of the network clock
+    F      -- Scaling factor of the projection. Batched networks can give
+              one factor per trial.
+    trials -- Trial of each spike, for batched networks
+    """
+
+    syn = FanOut(self.indptr, fired)
+    target = (self.indices[syn],)
+
+    if trials is None:
+      weight = F * self.weight[syn]
+    else:
+      # Trial of every synaptic event, which picks the row of the buffer
+      trials = np.repeat(trials, self.indptr[fired + 1] - self.indptr[fired])
+      weight = TrialFactor(F, trials) * self.weight[syn]
+      target = (trials,) + target
+
+    if self.uniformLag is None:
+      slots = (clock + self.lag[syn]) % self.Dmax
+      np.add.at(self.buffer, (slots,) + target, weight)
+    else:
+      # All the spikes arrive at the same time, so they all go into one
+      # slot. The input of every target neuron is summed first and added to
+      # the slot once, touching only the targets of the spikes.
+      slot = (clock + self.uniformLag) % self.Dmax
+      flat = np.ravel_multi_index(target, self.buffer.shape[1:])
+      touched, inverse = np.unique(flat, return_inverse=True)
+      self.buffer[slot].reshape(-1)[touched] += np.bincount(inverse, weight)
+
+  def ScatterBlock(self, fired, bounds, clock, F):
+    """
+    Scatter the spikes of several Euler steps of an unbatched network at
+    once, with the same result as calling Scatter on each of the groups
+    fired[bounds[k]:bounds[k+1]]. Done by the compiled kernels when they are
+    available.
+
+    Inputs:
+    fired  -- Indices of the source neurons that have fired, step by step
+    bounds -- Positions in fired where the spikes of each step start, plus
+              the end of the last step
+    clock  -- Current value of the network clock
+    F      -- Scaling factor of the projection
+    """
+
+    if not Kernels.available:
+      for k in xrange(len(bounds) - 1):
+        if bounds[k+1] > bounds[k]:
+          self.Scatter(fired[bounds[k]:bounds[k+1]], clock, F)
+    elif self.uniformLag is None:
+      Kernels.ScatterLags(fired[:bounds[-1]], clock, float(F), self.indptr,
+                          self.indices, self.weight, self.lag, self.buffer)
+    else:
+      slot = (clock + self.uniformLag) % self.Dmax
+      Kernels.ScatterUniformLag(fired, bounds, slot, float(F), self.indptr,
+                                self.indices, self.weight, self.buffer,
+                                *self.scratch)
+
+  def Collect(self, clock, out=None):
+    """
+    Return the input arriving at the target layer at the given clock value
+    and clear the corresponding buffer slot. If out is given, the input is
+    added to it instead of being returned as a new array.
+    """
+
+    slot = clock % self.Dmax
+    if out is None:
+      out = self.buffer[slot].copy()
+    else:
+      out += self.buffer[slot]
+    self.buffer[slot] = 0
+    return out
+
+  def Resume(self, old):
+    """
+    Take over the spikes in flight of a projection this one replaces.
+    """
+    if old.buffer.shape == self.buffer.shape:
+      self.buffer = old.buffer
+
+
+class UniformProjection(Projection):
+  """
+  All-to-all projection with the same weight and the same delay for every
+  synapse. Every spike then adds the same current to all the target neurons,
+  so a single number per buffer slot is stored and delivery is one add of the
+  number of source neurons that fired. Memory is O(Dmax) instead of
+  O(N_i x N_j).
+  """
+
+  def __init__(self, S, delay, Dmax, shape, zeroDelay, trials=None,
+               dtype=float):
+    """
+    Inputs as in Projection, with S and delay scalars or dense arrays whose
+    elements are all equal (see IsUniform).
+    """
+
+    self.S     = S
+    self.delay = delay
+    self.Dmax  = Dmax
+
+    self.weight = float(np.asarray(S).flat[0])
+    self.lag    = int(np.asarray(delay).flat[0])
+    if self.lag >= Dmax or self.lag < (0 if zeroDelay else 1):
+      self.weight = 0.0
+
+    # For batched networks, one number per trial, shaped to broadcast over
+    # the neurons of the target layer
+    shape = [Dmax]
+    if trials is not None:
+      shape += [trials, 1]
+    self.buffer = np.zeros(shape)
+
+  def Scatter(self, fired, clock, F, trials=None):
+    """
+    Add the contributions of the spikes of the given source neurons into the
+    buffer slot of their arrival time.
+    """
+
+    slot = (clock + self.lag) % self.Dmax
+    if trials is None:
+      self.buffer[slot] += F * self.weight * len(fired)
+    else:
+      count = np.bincount(trials, minlength=self.buffer.shape[1])
+      self.buffer[slot, :, 0] += F * self.weight * count
+
+  def ScatterBlock(self, fired, bounds, clock, F):
+    """
+    Scatter the spikes of several Euler steps at once, see
+    Projection.ScatterBlock.
+    """
+
+    slot = (clock + self.lag) % self.Dmax
+    for count in np.diff(bounds):
+      if count > 0:
+        self.buffer[slot] += F * self.weight * count
+
+  def Collect(self, clock, out=None):
+    """
+    Return the input arriving at every neuron of the target layer at the
+    given clock value and clear the corresponding buffer slot, or add it to
+    out, as in Projection.Collect.
+    """
+
+    slot = clock % self.Dmax
+    if out is None:
+      out = self.buffer[slot].copy()
+    else:
+      out += self.buffer[slot]
+    self.buffer[slot] = 0
+    return out
+
+
+class DelayBucketProjection(Projection):
+  """
+  Projection compiled into one sparse weight matrix W_d per distinct delay d.
+  Instead of scattering every spike, the spikes of the source layer are kept
+  in a history of depth Dmax and the input at time t is computed as
+  sum_d W_d * spiked(t-d), a fixed number of sparse products per millisecond
+  regardless of how many neurons fire.
+  """
+
+  mode = 'bucket'
+  connectivity = Projection.connectivity + ('bucket',)
+
+  def __init__(self, S, delay, Dmax, shape, zeroDelay, trials=None,
+               dtype=float):
+    """
+    Compile the delay buckets of a projection. Inputs as in Projection.
+    """
+
+    Projection.__init__(self, S, delay, Dmax, shape, zeroDelay, trials, dtype)
+    self.buffer = None
+
+    N, Nsource = shape
+    cols = np.repeat(np.arange(Nsource), np.diff(self.indptr))
+    lag = self.lag
+    if lag is None:
+      lag = self.uniformLag * np.ones(len(self.weight), dtype=int)
+
+    self.bucket = []
+    for d in np.unique(lag):
+      syn = lag == d
+      W = sp.csr_matrix((self.weight[syn], (self.indices[syn], cols[syn])),
+                        shape=(N, Nsource))
+      self.bucket.append((d, W))
+
+    # history[s] holds the spikes (scaled by F) emitted at clock stamp[s].
+    # Counts rather than booleans, so that a neuron firing twice in the same
+    # millisecond is delivered twice as in Projection.
+    self.history = np.zeros([Dmax] + TrialShape(trials) + [Nsource])
+    self.stamp   = -np.ones(Dmax, dtype=int)
+    self.shape   = TrialShape(trials) + [N]
+
+  def Scatter(self, fired, clock, F, trials=None):
+    """
+    Record the spikes of the given source neurons in the history.
+    """
+
+    slot = clock % self.Dmax
+    if self.stamp[slot] != clock:
+      self.history[slot] = 0
+      self.stamp[slot] = clock
+
+    if trials is None:
+      np.add.at(self.history[slot], fired, F)
+    else:
+      np.add.at(self.history[slot], (trials, fired), TrialFactor(F, trials))
+
+  def ScatterBlock(self, fired, bounds, clock, F):
+    """
+    Record the spikes of several Euler steps at once, see
+    Projection.ScatterBlock.
+    """
+    if bounds[-1] > 0:
+      self.Scatter(fired[:bounds[-1]], clock, F)
+
+  def Collect(self, clock, out=None):
+    """
+    Return the input arriving at the target layer at the given clock value,
+    or add it to out, as in Projection.Collect.
+    """
+
+    # With a trial axis the history rows are transposed into columns, so
+    # that all the trials go through each sparse product together
+    current = np.zeros(self.shape)
+    for d, W in self.bucket:
+      slot = (clock - d) % self.Dmax
+      if self.stamp[slot] == clock - d:
+        current += W.dot(self.history[slot].T).T
+
+    if out is None:
+      return current
+    out += current
+    return out
+
+  def Resume(self, old):
+    """
+    Take over the spike history of a projection this one replaces.
+    """
+    if old.history.shape == self.history.shape:
+      self.history = old.history
+      self.stamp   = old.stamp
+
+
+# Delivery methods that can be chosen per projection with layer[i].delivery[j]
+DELIVERY = {'ring': Projection, 'bucket': DelayBucketProjection}
+
+
+def IsUniform(x):
+  """
+  Whether x is a scalar or a dense array with all its elements equal.
+  """
+
+  if np.isscalar(x):
+    return True
+  if sp.issparse(x):
+    return False
+
+  x = np.asarray(x)
+  return x.size > 0 and np.all(x == x.flat[0])
+
+
+def ReadOnly(x):
+  """
+  Read-only copy of x that shares its memory, where x is an array, a
+  scipy.sparse matrix or a list or tuple of them. x itself stays writable.
+  Other objects are returned as they are.
+  """
+
+  if isinstance(x, np.ndarray):
+    view = x.view()
+    view.setflags(write=False)
+    return view
+  elif sp.issparse(x):
+    view = copy.copy(x)
+    for name in ('data', 'indices', 'indptr', 'row', 'col'):
+      if isinstance(getattr(x, name, None), np.ndarray):
+        setattr(view, name, ReadOnly(getattr(x, name)))
+    return view
+  elif isinstance(x, (list, tuple)):
+    return type(x)(ReadOnly(y) for y in x)
+  return x
+
+
+def TrialShape(trials):
+  """
+  Leading dimensions of the arrays of a layer: [] for a single trial, or
+  [trials] for batched networks.
+  """
+  return [] if trials is None else [trials]
+
+
+def TrialFactor(F, trials):
+  """
+  Scaling factor of each of a batch of synaptic events, given the trial they
+  belong to. F is a scalar or an array with one factor per trial.
+  """
+  if np.isscalar(F):
+    return F
+  return np.asarray(F)[trials]
+
+
+def SynapseDelays(delay, rows, cols):
+  """
+  Delays of the synapses at the given (target, source) positions, as an
+  integer array. delay can be a scalar, a dense array or a sparse matrix.
+  """
+
+  if np.isscalar(delay):
+    lag = delay * np.ones(len(rows))
+  elif sp.issparse(delay):
+    lag = np.asarray(sp.csr_matrix(delay)[rows, cols]).ravel()
+  else:
+    lag = np.asarray(delay)[rows, cols]
+
+  return np.asarray(lag, dtype=int)
+
+
+def BlockConnectivity(net):
+  """
+  Assemble all the projections of a network into network-wide weight and
+  delay matrices. Block (i, j) holds layer[i].S[j] scaled by
+  layer[i].factor[j], with neurons numbered consecutively across layers.
+
+  Outputs:
+  W, delay -- Sparse (N x N) weight and delay matrices, where N is the
+              total number of neurons in the network
+  """
+
+  offset = np.cumsum([0] + [net.layer[i].N for i in xrange(net.Nlayers)])
+  rows, cols, weight, lag = [], [], [], []
+
+  for i in xrange(net.Nlayers):
+    for j in net.layer[i].S:
+      S = net.layer[i].S[j]
+      if np.isscalar(S):
+        S = S * np.ones([net.layer[i].N, net.layer[j].N])
+
+      block = sp.coo_matrix(S)
+      rows.append(block.row + offset[i])
+      cols.append(block.col + offset[j])
+      weight.append(net.layer[i].factor[j] * block.data.astype(float))
+      lag.append(SynapseDelays(net.layer[i].delay[j], block.row, block.col))
+
+  ij = (np.concatenate(rows + [[]]).astype(int),
+        np.concatenate(cols + [[]]).astype(int))
+  shape = (offset[-1], offset[-1])
+
+  W = sp.csc_matrix((np.concatenate(weight + [[]]), ij), shape)
+  delay = sp.csc_matrix((np.concatenate(lag + [[]]), ij), shape)
+
+  return W, delay
+
+
+def FanOut(indptr, fired):
+  """
+  Positions in a column-compressed table of all the synapses of the given
+  source neurons.
+
+  Inputs:
+  indptr -- Column pointer array of the table
+  fired  -- Indices of the source neurons
+  """
+
+  starts = indptr[fired]
+  counts = indptr[np.asarray(fired) + 1] - starts
+  offsets = np.cumsum(counts) - counts
+
+  return np.arange(counts.sum()) + np.repeat(starts - offsets, counts)
+
+
+def GetProjection(net, i, j):
+  """
+  Return the compiled projection from layer j to layer i of the network,
+  compiling it again if layer[i].S[j] or layer[i].delay[j] have been
+  replaced by other objects, the delivery method in layer[i].delivery[j]
+  (default 'ring') has changed, or Network.Recompile has been called.
+  Changes made to S[j] or delay[j] in place are not detected. Spikes
+  already in flight are kept when the delivery method and shapes allow it.
+
+  Ring delivery of projections with a uniform weight and delay (scalars, or
+  dense arrays with all elements equal) is detected here and compiled into a
+  UniformProjection.
+  """
+
+  lay = net.layer[i]
+  proj = lay.projection.get(j)
+  mode = lay.delivery.get(j, 'ring')
+
+  if (proj is None or proj.mode != mode or
+      not proj.Matches(lay.S[j], lay.delay[j])):
+    kind = DELIVERY[mode]
+    if kind is Projection and IsUniform(lay.S[j]) and IsUniform(lay.delay[j]):
+      kind = UniformProjection
+
+    new = kind(lay.S[j], lay.delay[j], net.Dmax, (lay.N, net.layer[j].N),
+               i > j, getattr(net, 'trials', None), net.dtype)
+    if proj is not None and proj.__class__ is new.__class__:
+      new.Resume(proj)
+    lay.projection[j] = proj = new
+
+  return proj
+
+
+def ScatterSpikes(net, j, fired, trials=None):
+  """
+  Deliver the spikes of neurons in layer j into the input buffers of every
+  layer that receives connections from layer j.
+
+  Inputs:
+  net    -- Network, e.g. IzNetwork, QIFNetwork or HhNetwork
+  j      -- Number of the layer whose neurons have fired
+  fired  -- Indices of the neurons in layer j that have fired
+  trials -- Trial of each spike, for batched networks
+  """
+
+  for i in xrange(net.Nlayers):
+    if j in net.layer[i].S:
+      proj = GetProjection(net, i, j)
+      proj.Scatter(fired, net.clock, net.layer[i].factor[j], trials)
+
+
+def ScatterSpikeBlock(net, j, fired, bounds):
+  """
+  Deliver the spikes of neurons in layer j over several Euler steps of an
+  unbatched network, see Projection.ScatterBlock.
+  """
+
+  for i in xrange(net.Nlayers):
+    if j in net.layer[i].S:
+      proj = GetProjection(net, i, j)
+      proj.ScatterBlock(fired, bounds, net.clock, net.layer[i].factor[j])
+
+
+def IncomingCurrent(net, i, out=None):
+  """
+  Total synaptic input arriving at layer i in the current millisecond, in
+  the dtype of the network. The buffer slots that are read are cleared.
+
+  If out is given, a float64 array of the shape of the layer, the input is
+  summed in it and returned as it is, so that nothing is allocated.
+  """
+
+  if out is None:
+    current = np.zeros(TrialShape(getattr(net, 'trials', None)) +
+                       [net.layer[i].N])
+  else:
+    current = out
+    current[...] = 0
+
+  for j in net.layer[i].projection:
+    net.layer[i].projection[j].Collect(net.clock, current)
+
+  if out is None:
+    current = current.astype(net.dtype, copy=False)
+  return current
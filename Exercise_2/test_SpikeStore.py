@@ -0,0 +1,158 @@
+"""
+Computational Neurodynamics
+Exercise 2
+
+Tests of the on-disk spike stores of Network.StoreSpikes: the spikes
+logged before they are created, a run resumed from a checkpoint, and forks
+of the network. Run with pytest from this directory.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import scipy.sparse as sp
+import pytest
+from IzNetwork import IzNetwork
+from SpikeStore import ReadSpikes
+
+N = [80, 20]
+
+
+def Build():
+  """
+  Two randomly connected layers of regular spiking neurons.
+  """
+
+  rs = np.random.RandomState(0)
+  net = IzNetwork(N, 5)
+
+  for i in range(2):
+    lay = net.layer[i]
+    lay.a = 0.02 * np.ones(N[i])
+    lay.b = 0.2 * np.ones(N[i])
+    lay.c = -65 * np.ones(N[i])
+    lay.d = 8 * np.ones(N[i])
+    lay.v = -65 * np.ones(N[i])
+    lay.u = lay.b * lay.v
+
+    for j in range(2):
+      lay.S[j] = sp.random(N[i], N[j], 0.2, random_state=rs, format='csr')
+      lay.factor[j] = 10.0 if j == 0 else -10.0
+      lay.delay[j] = 1 + rs.randint(5, size=(N[i], N[j]))
+
+  return net
+
+
+def Run(net, rs, start, end):
+  for t in range(start, end):
+    for i in range(2):
+      net.layer[i].I = 6 * rs.randn(N[i])
+    net.Update(t)
+
+
+def Stored(net, path):
+  net.FlushSpikes()
+  return [ReadSpikes('%s_%d' % (path, i)) for i in range(2)]
+
+
+def test_earlier_spikes(tmpdir):
+  path = str(tmpdir.join('run'))
+
+  net = Build()
+  rs = np.random.RandomState(1)
+  Run(net, rs, 0, 50)
+  logged = [net.layer[i].firings.copy() for i in range(2)]
+  assert len(logged[0]) > 0
+
+  # The spikes logged in memory, and then those in the files, are kept
+  net.StoreSpikes(path, chunk=7)
+  for a, b in zip(logged, Stored(net, path)):
+    assert np.array_equal(a, b)
+
+  Run(net, rs, 50, 100)
+  stored = Stored(net, path)
+  net.StoreSpikes(path, chunk=7)
+  for a, b in zip(stored, Stored(net, path)):
+    assert np.array_equal(a, b)
+
+
+def test_checkpoint(tmpdir):
+  path = str(tmpdir.join('run'))
+  checkpoint = str(tmpdir.join('run.pkl'))
+
+  # Uninterrupted run
+  net = Build()
+  net.StoreSpikes(path, chunk=7)
+  rs = np.random.RandomState(1)
+  Run(net, rs, 0, 100)
+  whole = Stored(net, path)
+  assert len(whole[0]) > 0
+
+  # Run on past the checkpoint, then resume from it in a new network
+  net = Build()
+  net.StoreSpikes(path, chunk=7)
+  rs = np.random.RandomState(1)
+  Run(net, rs, 0, 50)
+  net.SaveCheckpoint(checkpoint, rs)
+  Run(net, rs, 50, 70)
+  net.FlushSpikes()
+
+  net = Build()
+  net.LoadCheckpoint(checkpoint, rs)
+  Run(net, rs, 50, 100)
+
+  for a, b in zip(whole, Stored(net, path)):
+    assert np.array_equal(a, b)
+
+
+def test_checkpoint_truncated(tmpdir):
+  path = str(tmpdir.join('run'))
+  checkpoint = str(tmpdir.join('run.pkl'))
+
+  net = Build()
+  net.StoreSpikes(path, chunk=7)
+  Run(net, np.random.RandomState(1), 0, 50)
+  net.SaveCheckpoint(checkpoint, None)
+
+  # StoreSpikes empties the files the checkpoint refers to
+  net = Build()
+  net.StoreSpikes(path)
+  with pytest.raises(ValueError):
+    net.LoadCheckpoint(checkpoint, None)
+  assert os.path.getsize(path + '_0_t.bin') == 0
+
+
+def test_fork(tmpdir):
+  path = str(tmpdir.join('run'))
+
+  net = Build()
+  net.StoreSpikes(path, chunk=7)
+  rs = np.random.RandomState(1)
+  Run(net, rs, 0, 50)
+  net.FlushSpikes()
+  before = Stored(net, path)
+
+  # A fork neither writes to nor reads the files of the original
+  fork = net.Fork()
+  with pytest.raises(ValueError):
+    Run(fork, np.random.RandomState(2), 50, 60)
+  with pytest.raises(ValueError):
+    fork.layer[0].firings
+  fork.FlushSpikes()
+
+  for a, b in zip(before, Stored(net, path)):
+    assert np.array_equal(a, b)
+
+  # until it is given stores of its own
+  fork = net.Fork()
+  fork.StoreSpikes(path + '_fork')
+  Run(fork, np.random.RandomState(2), 50, 100)
+  Run(net, rs, 50, 100)
+
+  for a, b in zip(before, Stored(net, path)):
+    assert np.array_equal(a, b[:len(a)])
+  assert all(f[:, 0].min() >= 50 for f in Stored(fork, path + '_fork'))
@@ -11,9 +11,10 @@ sys.path.append('../Exercise_2')
 from IzNetwork import IzNetwork
 import numpy as np
 import numpy.random as rn
+import scipy.sparse as sp
 
 
-def Sync2Connect(N1, N2):
+def Sync2Connect(N1, N2, trials=None):
   """
   Constructs two populations of neurons (comprising two layers each) that
   oscillate in the gamma range using PING, and that can be couped together to
@@ -23,6 +24,12 @@ def Sync2Connect(N1, N2):
   degrees out of phase with each other if they have the same natural frequency.
   Coupling the inhibitory populations causes complete synchronisation with zero
   phase lag, even if they have slightly different natural frequencies.
+
+  Inputs:
+  N1, N2 -- Number of excitatory and inhibitory neurons in each population
+  trials -- Number of trials to simulate together in a batched IzNetwork, or
+            None for a single one. Per-trial inputs and coupling factors can
+            then be set as (trials, N) arrays and length-trials vectors.
   """
 
   # Conduction delays - 2 for 56Hz, 5 for 40Hz, 8 for 32Hz
@@ -30,7 +37,7 @@ def Sync2Connect(N1, N2):
   D2 = 4
   D = 5  # conduction delay for inter-population connections
 
-  net = IzNetwork([N1, N2, N1, N2], max(D1, D2) + 1)
+  net = IzNetwork([N1, N2, N1, N2], max(D1, D2) + 1, trials)
 
   # Neuron parameters
   # Each layer comprises a heterogenous set of neurons, with a small spread
@@ -71,6 +78,7 @@ def Sync2Connect(N1, N2):
   # Connectivity matrix (synaptic weights)
   # layer{i}.S{j} is the connectivity matrix from layer j to layer i
   # s(i,j) is the strength of the connection from neuron j to neuron i
+  # The sparse (1%) projections are stored as scipy.sparse matrices
 
   # Excitatory to inhibitory connections
   net.layer[1].S[0] = rn.rand(N2, N1)
@@ -81,20 +89,20 @@ def Sync2Connect(N1, N2):
   net.layer[2].S[3] = -1.0*rn.rand(N1, N2)
 
   # Excitatory to excitatory connections
-  net.layer[0].S[0] = 1*(rn.rand(N1, N1) < 0.01)
-  net.layer[2].S[2] = 1*(rn.rand(N1, N1) < 0.01)
+  net.layer[0].S[0] = sp.csr_matrix(1*(rn.rand(N1, N1) < 0.01))
+  net.layer[2].S[2] = sp.csr_matrix(1*(rn.rand(N1, N1) < 0.01))
 
   # Inhibitory to inhibitory connections
   net.layer[1].S[1] = -1.0*rn.rand(N2, N2)
   net.layer[3].S[3] = -1.0*rn.rand(N2, N2)
 
   # Coupling between populations (excitatory to excitatory)
-  net.layer[2].S[0] = 1*(rn.rand(N1, N1) < 0.01)
-  net.layer[0].S[2] = 1*(rn.rand(N1, N1) < 0.01)
+  net.layer[2].S[0] = sp.csr_matrix(1*(rn.rand(N1, N1) < 0.01))
+  net.layer[0].S[2] = sp.csr_matrix(1*(rn.rand(N1, N1) < 0.01))
 
   # Coupling between populations (excitatory to inhibitory)
-  net.layer[3].S[0] = 1*(rn.rand(N2, N1) < 0.01)
-  net.layer[1].S[2] = 1*(rn.rand(N2, N1) < 0.01)
+  net.layer[3].S[0] = sp.csr_matrix(1*(rn.rand(N2, N1) < 0.01))
+  net.layer[1].S[2] = sp.csr_matrix(1*(rn.rand(N2, N1) < 0.01))
 
   ## Scaling factors
   # Within oscillator 1
@@ -118,23 +126,24 @@ def Sync2Connect(N1, N2):
   net.layer[1].factor[2] = 12
 
   ## Conduction delays
+  # Every projection has a uniform delay, given as a scalar
   # Within oscillator 1
-  net.layer[1].delay[0] = D1 * np.ones([N2, N1])
-  net.layer[0].delay[1] = D1 * np.ones([N1, N2])
-  net.layer[0].delay[0] = D1 * np.ones([N1, N1])
-  net.layer[1].delay[1] = D1 * np.ones([N2, N2])
+  net.layer[1].delay[0] = D1
+  net.layer[0].delay[1] = D1
+  net.layer[0].delay[0] = D1
+  net.layer[1].delay[1] = D1
 
   # Within oscillator 2
-  net.layer[3].delay[2] = D2 * np.ones([N2, N1])
-  net.layer[2].delay[3] = D2 * np.ones([N1, N2])
-  net.layer[2].delay[2] = D2 * np.ones([N1, N1])
-  net.layer[3].delay[3] = D2 * np.ones([N2, N2])
+  net.layer[3].delay[2] = D2
+  net.layer[2].delay[3] = D2
+  net.layer[2].delay[2] = D2
+  net.layer[3].delay[3] = D2
 
-  net.layer[2].delay[0] = D * np.ones([N1, N1])
-  net.layer[0].delay[2] = D * np.ones([N1, N1])
+  net.layer[2].delay[0] = D
+  net.layer[0].delay[2] = D
 
-  net.layer[3].delay[0] = D * np.ones([N2, N1])
-  net.layer[1].delay[2] = D * np.ones([N2, N1])
+  net.layer[3].delay[0] = D
+  net.layer[1].delay[2] = D
 
   return net
 
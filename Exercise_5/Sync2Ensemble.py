@@ -0,0 +1,100 @@
+"""
+Computational Neurodynamics
+Exercise 5
+
+Synchronisation of the two PING networks of Sync2Connect as a function of
+the strength of their excitatory coupling, averaged over several noise
+seeds. The network is built and run through the initial transient once,
+and every run of the ensemble is forked from that settled state (see
+Network.Fork), so that no run simulates the transient again or rebuilds
+the connectivity. The runs are spread over worker processes with
+Ensemble.RunEnsemble.
+
+(C) Murray Shanahan et al, 2015
+"""
+
+import sys
+sys.path.append('../Exercise_2')
+
+from Sync2Connect import Sync2Connect
+from SynchronisationIndex import SynchronisationIndex
+from Ensemble import RunEnsemble
+from SpikeTrains import MovingRate
+import numpy as np
+import numpy.random as rn
+import matplotlib.pyplot as plt
+
+N1 = 800
+N2 = 200
+
+T         = 1000  # simulation time per run, transient included
+transient = 100   # settling time shared by all the runs
+Ib        = 5     # base current
+
+couplings = [0, 1, 2, 5, 10]  # factors of the excitatory coupling
+seeds     = range(4)           # noise seeds per coupling
+
+
+def Drive(net, rs, t):
+  """
+  Deliver the base current of Sync2Run, with the onset of activity of the
+  second population delayed.
+  """
+
+  net.layer[0].I = Ib*rs.randn(N1)
+  net.layer[1].I = Ib*rs.randn(N2)
+  if t > 12:
+    net.layer[2].I = Ib*rs.randn(N1)
+    net.layer[3].I = Ib*rs.randn(N2)
+  else:
+    net.layer[2].I = np.zeros(N1)
+    net.layer[3].I = np.zeros(N2)
+
+
+def Trial(net, setting):
+  """
+  Continue a fork of the settled network with the given (coupling, seed)
+  setting, and return its mean synchronisation index.
+  """
+
+  coupling, seed = setting
+  rs = rn.RandomState(seed)
+
+  # Excit-Excit coupling, deactivated in Sync2Connect
+  net.layer[2].factor[0] = coupling
+  net.layer[0].factor[2] = coupling
+
+  for t in xrange(transient, T):
+    Drive(net, rs, t)
+    net.Update(t)
+
+  MF0, MF2 = MovingRate([net.layer[0].firings, net.layer[2].firings], N1, T,
+                        start=transient)
+
+  phi = SynchronisationIndex(MF0, MF2, N1, T - transient, 0, False)
+  return np.mean(phi)
+
+
+if __name__ == '__main__':
+  # Build the network and settle it once
+  net = Sync2Connect(N1, N2)
+  for lr in xrange(net.Nlayers):
+    net.layer[lr].v = -65 * np.ones(net.layer[lr].N)
+    net.layer[lr].u = net.layer[lr].b * net.layer[lr].v
+
+  for t in xrange(transient):
+    Drive(net, rn, t)
+    net.Update(t)
+
+  settings = [(coupling, seed) for coupling in couplings for seed in seeds]
+  sync = np.array(RunEnsemble(net, Trial, settings))
+  sync = sync.reshape(len(couplings), len(seeds))
+
+  for k in xrange(len(couplings)):
+    print 'Coupling %5.1f: synchronisation %.3f +- %.3f' % (
+      couplings[k], np.mean(sync[k]), np.std(sync[k]))
+
+  plt.errorbar(couplings, np.mean(sync, 1), np.std(sync, 1))
+  plt.xlabel('Excitatory coupling factor')
+  plt.ylabel('Mean synchronisation')
+  plt.show()
@@ -14,9 +14,19 @@ import numpy.random as rn
 import matplotlib.pyplot as plt
 
 
-def Sync2Run():
+def Sync2Run(path=None):
   """
-  Docstring
+  Simulate the two coupled PING networks of Sync2Connect and plot their
+  firings and mean firing rates.
+
+  Inputs:
+  path -- Prefix of files to stream the spikes to as the run goes, see
+          Network.StoreSpikes, or None to keep them in memory. The files can
+          be read back with SpikeStore.ReadSpikes, also during the run.
+
+  Outputs:
+  MF0, MF2 -- Moving averages of the firing rates of the excitatory
+              populations
   """
 
   N1   = 800
@@ -33,9 +43,26 @@ def Sync2Run():
     net.layer[lr].u = net.layer[lr].b * net.layer[lr].v
     net.layer[lr].firings = np.array([])
 
+  if path is not None:
+    net.StoreSpikes(path)
+
+  # Moving averages of firing rates in Hz for excitatory population, read
+  # from rate monitors as the network runs
+  ws = 10  # window size
+  ds = 1   # slide window by ds
+  rate0 = net.MonitorRate(0, ws)
+  rate2 = net.MonitorRate(2, ws)
+  MF0 = np.zeros(int(np.ceil(T*1.0/ds)))
+  MF2 = np.zeros(int(np.ceil(T*1.0/ds)))
+
   # SIMULATE
   for t in xrange(T):
 
+    # Rates over the window of ws ms ending now
+    if t % ds == 0:
+      MF0[t/ds] = rate0.Rate()
+      MF2[t/ds] = rate2.Rate()
+
     # Deliver base current
     net.layer[0].I = Ib*rn.randn(N1)
     net.layer[1].I = Ib*rn.randn(N2)
@@ -55,19 +82,12 @@ def Sync2Run():
     # Update all the neurons
     net.Update(t)
 
+  if path is not None:
+    net.FlushSpikes()
+
   firings0 = net.layer[0].firings
   firings2 = net.layer[2].firings
 
-  # Moving averages of firing rates in Hz for excitatory population
-  ws = 10  # window size
-  ds = 1   # slide window by ds
-  MF0 = np.zeros(np.ceil(T*1.0/ds))
-  MF2 = np.zeros(np.ceil(T*1.0/ds))
-
-  for j in xrange(1, T, ds):
-    MF0[j/ds] = sum(1*(firings0[:, 0] >= (j-ws)) * (firings0[:, 0] < j)) * 1000.0/(ws*N1)
-    MF2[j/ds] = sum(1*(firings2[:, 0] >= (j-ws)) * (firings2[:, 0] < j)) * 1000.0/(ws*N1)
-
   # Raster plots of firings
   plt.subplot(211)
   if firings0.size is not 0:
@@ -10,12 +10,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 
-def SynchronisationIndex(MF1, MF2, N, T):
+def SynchronisationIndex(MF1, MF2, N, T, discard=100, plot=True):
   """
   Computes the synchronisation index between two populations given firing data
   MF1 and MF2, where N is the total number of neurons in each population and T
   is the length of the run that produced the data
 
+  The first discard ms are left out as the initial transient. Runs forked
+  from a settled network (see Sync2Ensemble.py) have none, so discard can
+  be 0. With plot False nothing is printed or plotted.
+
+  Returns the synchronisation index at every ms after the transient
   """
 
   # Centre time series on zero
@@ -23,7 +28,6 @@ def SynchronisationIndex(MF1, MF2, N, T):
   MF2 = MF2 - np.mean(MF2)
 
   # Discard initial transient period
-  discard = 100
   MF1 = MF1[discard:]
   MF2 = MF2[discard:]
 
@@ -34,6 +38,9 @@ def SynchronisationIndex(MF1, MF2, N, T):
   # Calculate synchronisation index
   phi = np.abs((np.exp(1j*phase1) + np.exp(1j*phase2)) / 2.0)
 
+  if not plot:
+    return phi
+
   print "Mean synchronisation: ", np.mean(phi)
 
   # Plot mean firing rates
@@ -56,3 +63,4 @@ def SynchronisationIndex(MF1, MF2, N, T):
 
   plt.show()
 
+  return phi
@@ -3,35 +3,50 @@ Hodgekin-Huxley Network
 
 """
 
+import sys
+sys.path.append('../Exercise_2')
+
 import numpy as np
-from SimulationMethods import eul, rk4
-from NeuronModels import HodgekinHuxley
+from Network import Network, Layer
+from SpikeLog import SpikeLog
+from Synapses import Projection, BlockConnectivity
+from SimulationMethods import rk4_workspace, rk4_inplace
+from SimulationMethods import rush_larsen, rush_larsen2, rush_larsen_workspace
+from SimulationMethods import dopri5, dopri5_workspace
+from NeuronModels import HodgekinHuxleyInPlace
+from NeuronModels import HodgekinHuxleyLinear, HodgekinHuxleyWorkspace
 
-class HhNetwork:
-    """
 
+class HhNetwork(Network):
+    """
+    Network of Hodgkin-Huxley neurons. A Network whose layers are all
+    HhLayer.
     """
 
-    def __init__(self, _neuronsPerLayer, _Dmax):
+    def __init__(self, _neuronsPerLayer, _Dmax, _dtype=float):
         """
         Initialise network with given number of neurons
 
         Inputs:
-        _neuronsPerLayer -- List with the number of neurons in each layer. A list
-                            [N1, N2, ... Nk] will return a network with k layers
-                            with the corresponding number of neurons in each.
-
-        _Dmax            -- Maximum delay in all the synapses in the network. Any
-                            longer delay will result in failing to deliver spikes.
+        _neuronsPerLayer -- List with the number of neurons in each layer.
+                            A list [N1, N2, ... Nk] will return a network
+                            with k layers with the corresponding number of
+                            neurons in each.
+
+        _Dmax            -- Maximum delay in all the synapses in the network.
+                            Any longer delay will result in failing to
+                            deliver spikes.
+
+        _dtype           -- Floating point type of the state, the parameters
+                            and the synaptic weights, float (float64) by
+                            default or np.float32. 'dopri5' needs float64.
         """
 
-        self.Dmax = _Dmax
-        self.Nlayers = len(_neuronsPerLayer)
-
-        self.layer = {}
+        Network.__init__(self, [HhLayer(n, _dtype) for n in _neuronsPerLayer],
+                         _Dmax, None, _dtype)
 
-        for i, n in enumerate(_neuronsPerLayer):
-            self.layer[i] = HhLayer(n)
+        # Whether the network runs in flat mode, see Flatten
+        self.flat = False
 
     def Update(self, t):
         """
@@ -39,105 +54,208 @@ class HhNetwork:
         network's internal variables.
 
         Inputs:
-        t -- Current timestep. Necessary to sort out the synaptic delays.
+        t -- Current timestep. Only used to timestamp the spikes.
+        """
+        if self.flat:
+            self.FlatUpdate(t)
+            self.clock += 1
+            self.Monitor()
+        else:
+            Network.Update(self, t)
+
+    def SetIntegrator(self, integrator, dt):
+        """
+        Choose the integration method and step size of every layer. See
+        HhLayer for the methods available.
+
+        Inputs:
+        integrator -- 'rk4', 'rush-larsen', 'rush-larsen2' or 'dopri5'
+        dt         -- Step size in ms, or the initial step size for 'dopri5'
         """
         for lr in xrange(self.Nlayers):
-            self.NeuronUpdate(lr, t)
+            self.layer[lr].integrator = integrator
+            self.layer[lr].dt = dt
+
+        if self.flat:
+            self.whole.integrator = integrator
+            self.whole.dt = dt
+
+    def Flatten(self):
+        """
+        Switch the network to flat mode, as IzNetwork.Flatten does for
+        Izhikevich networks. The state and parameters of all the layers are
+        packed into one network-wide HhLayer, self.whole, integrated in one
+        go every millisecond, and all the projections into one block-sparse
+        connectivity. This pays off for networks of many small layers, such
+        as the Braitenberg controller of RobotConnect4L, whose millisecond
+        is otherwise dominated by the Python loop over layers and
+        projections.
+
+        Call it once the parameters, the initial state, the connectivity and
+        the integrator of the layers have been set, and again after changing
+        any S, delay, factor or rate table. Afterwards the x and param
+        arrays of the layers are views into those of self.whole, so
+        net.layer[i].v and friends can be assigned as usual.
+
+        In flat mode all the layers are updated at the same time, so
+        synapses with zero delay are never delivered and layer[i].delivery
+        is ignored. All the layers must have the same integrator, step size
+        and rate table. 'dopri5' is not supported, since it adapts its step
+        size to each layer separately.
+        """
 
-    def NeuronUpdate(self, i, t):
+        first = self.layer[0]
+        for i in xrange(self.Nlayers):
+            lay = self.layer[i]
+            if (lay.integrator != first.integrator or lay.dt != first.dt or
+                    lay.rateTable is not first.rateTable):
+                raise ValueError('Flat mode needs the same integrator, step '
+                                 'size and rate table in all the layers')
+        if first.integrator == 'dopri5':
+            raise ValueError('Flat mode does not support dopri5, whose step '
+                             'size is adapted to each layer')
+
+        self.offset = np.cumsum([0] + [self.layer[i].N
+                                       for i in xrange(self.Nlayers)])
+
+        whole = HhLayer(self.offset[-1], self.dtype)
+        for i in xrange(self.Nlayers):
+            whole.x[:, self.offset[i]:self.offset[i+1]] = self.layer[i].x
+            whole.param[:, self.offset[i]:self.offset[i+1]] = \
+                self.layer[i].param
+        whole.integrator = first.integrator
+        whole.dt = first.dt
+        whole.rateTable = first.rateTable
+
+        self.whole = whole
+        self.BindViews()
+
+        W, delay = BlockConnectivity(self)
+        projection = Projection(W, delay, self.Dmax, W.shape, False, None,
+                                self.dtype)
+        if self.flat:
+            projection.Resume(self.projection)
+
+        self.projection = projection
+        self.flat = True
+
+    def BindViews(self):
+        """
+        Make the packed state and parameters of the layers views into those
+        of the network-wide layer of flat mode, see Flatten.
         """
-        Hodgekin-Huxley neuron update function. Update one layer for 1 millisecond
-        using the Euler method.
+        for i in xrange(self.Nlayers):
+            self.layer[i].x = self.whole.x[:, self.offset[i]:self.offset[i+1]]
+            self.layer[i].param = \
+                self.whole.param[:, self.offset[i]:self.offset[i+1]]
+
+    def Connectivity(self):
+        """
+        The connectivity of the network, see Network.Connectivity, including
+        the network-wide projection of flat mode.
+        """
+        shared = Network.Connectivity(self)
+        if self.flat:
+            shared += self.projection.Connectivity()
+        return shared
+
+    def __setstate__(self, state):
+        # Views are pickled as copies, so in flat mode the layers are bound
+        # to the network-wide layer again
+        self.__dict__.update(state)
+        if self.flat:
+            self.BindViews()
+
+    def FlatUpdate(self, t):
+        """
+        Update all the layers for 1 millisecond in flat mode.
 
         Inputs:
-        i -- Number of layer to update
-        t -- Current timestep. Necessary to sort out the synaptic delays.
-        """
-
-        # Euler method step size in ms
-        dt = 0.02
-
-        # Calculate current from incoming spikes
-        for j in xrange(self.Nlayers):
-            # LAYER I IS CONNECTED TO LAYER J IF THERE EXISTS A CONNECTIVITY MATIX S[J] I.E LAYER J --> LAYER I
-            # If layer[i].S[j] exists then layer[i].factor[j] and
-            # layer[i].delay[j] have to exist
-            if j in self.layer[i].S:
-                S = self.layer[i].S[j]  # target neuron->rows, source neuron->columns
-
-                # Firings contains time and neuron idx of each spike.
-                # [t, index of the neuron in the layer j]
-                firings = self.layer[j].firings
-
-                # Find incoming spikes taking delays into account
-                delay = self.layer[i].delay[j]
-                F = self.layer[i].factor[j]
-
-                # Sum current from incoming spikes
-                k = len(firings)
-                while k > 0 and (firings[k - 1, 0] > (t - self.Dmax)):
-                    idx = delay[:, firings[k - 1, 1]] == (t - firings[
-                        k - 1, 0])  # which reveiving neurons have been waiting long enough as all elements of delay are the same, all idx will be true or false
-                    self.layer[i].I[idx] += F * S[
-                        idx, firings[k - 1, 1]]  # firings[k-1,1] is the index of neuron that has fired,
-                    # idx the reveiving neurons which have been waiting long enough
-                    k = k - 1
-
-        # Update v and u using the HH model and RK4 method
-        for k in xrange(int(1 / dt)):
-
-            x = np.array([self.layer[i].v,
-                          self.layer[i].m,
-                          self.layer[i].n,
-                          self.layer[i].h])
-
-            fP = np.array([self.layer[i].I,
-                           self.layer[i].gNa,
-                           self.layer[i].gK,
-                           self.layer[i].gL,
-                           self.layer[i].ENa,
-                           self.layer[i].EK,
-                           self.layer[i].EL,
-                           self.layer[i].C])
-
-            self.layer[i].v, self.layer[i].m, self.layer[i].n, self.layer[i].h = rk4(x, dt, fP, HodgekinHuxley)
-
-        #     print(i, k, "v:", self.layer[i].v)
-        #     print(i, k, "m:", self.layer[i].m)
-        #     print(i, k, "n:", self.layer[i].n)
-        #     print(i, k, "h:", self.layer[i].h)
-        #
-        # print('\n')
+        t -- Current timestep. Only used to timestamp the spikes.
+        """
 
-        # Find index of neurons that have fired this millisecond
-        fired = np.where(self.layer[i].v >= 50)[0]  # gives the index of the fired neurons i.e the column of the array
+        whole = self.whole
 
-        if len(fired) > 0:
-            for f in fired:
-                # Add spikes into spike train
-                if len(self.layer[i].firings) != 0:
-                    self.layer[i].firings = np.vstack([self.layer[i].firings, [t, f]])
-                else:
-                    self.layer[i].firings = np.array([[t, f]])
+        whole.current[...] = 0
+        self.projection.Collect(self.clock, whole.current)
+        whole.AddCurrent(whole.current)
 
-        return
+        whole.Step()
+        fired = whole.Threshold(t)[0]
 
+        if len(fired) > 0:
+            # Split the spikes by layer using the offset table
+            owner = np.searchsorted(self.offset, fired, 'right') - 1
+            for lr in np.unique(owner):
+                self.layer[lr].LogSpikes(t, fired[owner == lr] -
+                                         self.offset[lr])
 
+            self.projection.Scatter(fired, self.clock, 1)
 
-class HhLayer:
+
+class HhLayer(Layer):
     """
-    Layer of Hodgkin-Huxley neurons to be used inside an IzNetwork.
+    Layer of Hodgkin-Huxley neurons. Step advances the layer by a whole
+    millisecond with its integration method, and the spikes are looked for
+    once at the end of it.
     """
 
-    def __init__(self, n):
+    # Rows of the packed state array x and parameter array param. The
+    # variables of the layer are views of these rows, see __setattr__.
+    stateVariables = ('v', 'm', 'n', 'h')
+    parameters = ('I', 'gNa', 'gK', 'gL', 'ENa', 'EK', 'EL', 'C')
+
+    def __init__(self, n, dtype=float):
         """
-        Initialise layer with empty vectors.
+        Initialise layer with empty vectors. S[j] and delay[j] as in Layer.
+
+        The state v, m, n, h is kept packed in a (4, N) array x and I and the
+        model parameters in an (8, N) array param, in the order of
+        HodgekinHuxley. Both are allocated once here, together with the RK4
+        stage buffers, so that the update does not allocate anything. All of
+        them have the given dtype.
 
         Inputs:
-        n -- Number of neurons in the layer
+        n     -- Number of neurons in the layer
+        dtype -- Floating point type of the state and the parameters
         """
 
-        self.N = n
+        Layer.__init__(self, n, None, dtype)
+
+        self.x = np.zeros([len(HhLayer.stateVariables), n], dtype=dtype)
+        self.param = np.zeros([len(HhLayer.parameters), n], dtype=dtype)
+        self.work = rk4_workspace(self.x)
+        self.linearWork = rush_larsen_workspace(self.x)
+        self.scratch = HodgekinHuxleyWorkspace(n, dtype)
+
+        # Integration method and its step size in ms. RK4 ('rk4') goes
+        # unstable on the gating variables at steps much larger than the
+        # default. The exponential Euler methods ('rush-larsen', first order,
+        # and 'rush-larsen2', second order) are stable at any step, see
+        # SimulationMethods. With constant input, 'rush-larsen2' at 0.05 ms
+        # drifts from RK4 at 0.02 ms by under 0.05 ms per spike, for
+        # 5 times fewer evaluations of the model.
+        #
+        # 'dopri5' is the adaptive Dormand-Prince 5(4) method, with one step
+        # size for the whole layer kept within the tolerances rtol and atol.
+        # It locates the upward crossings of v = 50 within the millisecond
+        # and logs their exact times in exactSpikes, in ms, read as exact.
+        # These crossings are the spikes of the layer, instead of the neurons
+        # with v >= 50 at the end of the millisecond. The number of
+        # evaluations of the model so far is counted in evaluations.
+        self.integrator = 'rk4'
+        self.dt = 0.02
+        self.rtol = 1e-5
+        self.atol = 1e-5
+        self.dopriWork = None
+        self.evaluations = 0
+        self.exactSpikes = SpikeLog(dtype=float)
+
+        # Rate functions interpolated from a NeuronModels.RateTable instead
+        # of computed exactly, or None. Trades a small, documented error for
+        # fewer exponentials, see RateTable.
+        self.rateTable = None
+
         self.gNa = np.zeros(n)
         self.gK = np.zeros(n)
         self.gL = np.zeros(n)
@@ -146,11 +264,116 @@ class HhLayer:
         self.EL = np.zeros(n)
         self.C = np.zeros(n)
 
-        self.S = {}
-        self.delay = {}
-        self.factor = {}
+        # Upward crossings of v = 50 located by 'dopri5' in the last Step
+        self.crossings = None
 
+    def Steps(self):
+        """
+        A single Step per millisecond, see Step.
+        """
+        return 1
 
+    def Step(self):
+        """
+        Advance the layer by 1 millisecond using its integration method and
+        step size.
+        """
 
+        # Step size in ms, rounded so that a whole number of steps makes up
+        # 1 millisecond
+        steps = int(round(1.0 / self.dt))
+        dt = 1.0 / steps
+
+        # Update v, m, n and h using the HH model. The state and the
+        # parameters are already packed in x and param, so the sub-steps
+        # work in place without allocating any arrays.
+        if self.integrator == 'rk4':
+            for k in xrange(steps):
+                rk4_inplace(self.x, dt, self.param, self.Derivative, self.work)
+        elif self.integrator == 'rush-larsen':
+            for k in xrange(steps):
+                rush_larsen(self.x, dt, self.param, self.Linear,
+                            self.linearWork)
+        elif self.integrator == 'rush-larsen2':
+            for k in xrange(steps):
+                rush_larsen2(self.x, dt, self.param, self.Linear,
+                             self.linearWork)
+        elif self.integrator == 'dopri5':
+            # One adaptive step size for the whole layer, carried over from
+            # one millisecond to the next
+            if self.x.dtype != np.float64:
+                raise ValueError('dopri5 needs a float64 network, its '
+                                 'tolerances are close to float32 precision')
+            if self.dopriWork is None:
+                self.dopriWork = dopri5_workspace(self.x)
+                self.step = self.dt
+
+            self.step, self.crossings, n = dopri5(self.x, 0.0, 1.0,
+                                                  self.param, self.Derivative,
+                                                  self.dopriWork, self.step,
+                                                  self.rtol, self.atol,
+                                                  (0, 50.0))
+            self.evaluations += n
+        else:
+            raise ValueError('Unknown integrator %r' % self.integrator)
+
+    def Threshold(self, t):
+        """
+        Neurons that have fired in the last millisecond. With 'dopri5' these
+        are the neurons whose potential crossed 50 upwards, and the exact
+        times of the crossings are logged, see exact. Otherwise they are the
+        neurons with v >= 50 at the end of the millisecond.
+        """
 
+        if self.integrator == 'dopri5':
+            fired, times = self.crossings
+            self.exactSpikes.Append(t + times, fired)
+            return (fired,)
 
+        return np.where(self.v >= 50)
+
+    @property
+    def exact(self):
+        """
+        Exact times of the spikes located by 'dopri5' as a (K, 2) array of
+        [time, index of the neuron] rows, with time in ms. Assigning an array
+        replaces the contents of the log, as with firings.
+        """
+        return self.exactSpikes.Array()
+
+    @exact.setter
+    def exact(self, value):
+        self.exactSpikes.Load(value)
+
+    def Derivative(self, x, param, out):
+        """
+        Writes the HH derivative of state x into out, using the layer's
+        scratch space and rate table.
+        """
+        return HodgekinHuxleyInPlace(x, param, out, self.scratch,
+                                     self.rateTable)
+
+    def Linear(self, x, param, a, b):
+        """
+        Writes the HH equations of state x in the form dx/dt = a - b * x,
+        using the layer's scratch space and rate table.
+        """
+        HodgekinHuxleyLinear(x, param, a, b, self.scratch, self.rateTable)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found the usual way
+        if name in HhLayer.stateVariables:
+            return self.__dict__['x'][HhLayer.stateVariables.index(name)]
+        if name in HhLayer.parameters:
+            return self.__dict__['param'][HhLayer.parameters.index(name)]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        # State variables and parameters are written into their rows of the
+        # packed arrays, so that the scripts can keep assigning to them
+        if name in HhLayer.stateVariables:
+            self.x[HhLayer.stateVariables.index(name)] = value
+        elif name in HhLayer.parameters:
+            self.param[HhLayer.parameters.index(name)] = value
+        else:
+            object.__setattr__(self, name, value)
@@ -8,13 +8,16 @@ import numpy as np
 def HodgekinHuxley(x, param):
 
     """
-    Computes the differential of the HH states given the current states and the model parameters
+    Computes the differential of the HH states given the current states and
+    the model parameters
 
         :param x: Current state [v(t); m(t); n(t); h(t)]
         :type x: np.array
-        :param param: Hodgkin-Huxley model parameters [I(t), gNa, gK, gL, ENa, EK, EL, C]
+        :param param: Hodgkin-Huxley model parameters
+                      [I(t), gNa, gK, gL, ENa, EK, EL, C]
         :type param: np.array
-        :return: dx/dt (differential of state) [(v_dt(t),m_dt(t),n_dt(t),h_dt(t))]
+        :return: dx/dt (differential of state)
+                 [(v_dt(t),m_dt(t),n_dt(t),h_dt(t))]
         :rtype: np.array
 
     param[]:
@@ -41,7 +44,299 @@ def HodgekinHuxley(x, param):
     ndot = (alpha_n * (1 - n) - beta_n * n)
     hdot = (alpha_h * (1 - h) - beta_h * h)
 
-    sigmaIk = gNa * (m ** 3) * h * (v - ENa) + gK * (n ** 4) * (v - EK) + gL * (v - EL)
+    sigmaIk = (gNa * (m ** 3) * h * (v - ENa) + gK * (n ** 4) * (v - EK) +
+               gL * (v - EL))
     vdot = (-sigmaIk + I) / C
 
     return np.array([vdot, mdot, ndot, hdot])
+
+
+
+# The six exponentials of the HH rate functions, for alpha_m, alpha_n,
+# alpha_h, beta_m, beta_n and beta_h, written as exp(slope * v + offset)
+RATE_SLOPE = np.array([-0.1, -0.1, -1 / 20.0, -1 / 18.0, -1 / 80.0,
+                       -0.1])[:, None]
+RATE_OFFSET = np.array([2.5, 1.0, 0.0, 0.0, 0.0, 3.0])[:, None]
+BETA_SCALE = np.array([4.0, 0.125])[:, None]
+
+def HodgekinHuxleyWorkspace(N, dtype=float):
+    """
+    Allocates the scratch space used by HodgekinHuxleyInPlace
+
+        :param N: Number of neurons
+        :type N: int
+        :param dtype: Floating point type of the state it is used with
+        :return: Scratch space
+        :rtype: np.array (20, N)
+    """
+    return np.zeros([20, N], dtype=dtype)
+
+def HodgekinHuxleyRates(v):
+    """
+    Evaluates the six HH rate functions, with the removable singularities of
+    alpha_m at v = 25 and of alpha_n at v = 10 replaced by their limits
+    (1 and 0.1). Both have the form c * y / (exp(y) - 1), computed with expm1
+    so that it stays accurate next to the singularity.
+
+        :param v: Membrane potentials
+        :type v: np.array (N,)
+        :return: [alpha_m; alpha_n; alpha_h; beta_m; beta_n; beta_h]
+        :rtype: np.array (6, N)
+    """
+    v = np.asarray(v, dtype=float)
+    ym = 2.5 - 0.1 * v
+    yn = 1.0 - 0.1 * v
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha_m = np.where(ym == 0, 1.0, ym / np.expm1(ym))
+        alpha_n = 0.1 * np.where(yn == 0, 1.0, yn / np.expm1(yn))
+
+    alpha_h = 0.07 * np.exp(-v / 20.0)
+    beta_m = 4.0 * np.exp(-v / 18.0)
+    beta_n = 0.125 * np.exp(-v / 80.0)
+    beta_h = 1.0 / (np.exp(3.0 - 0.1 * v) + 1.0)
+
+    return np.array([alpha_m, alpha_n, alpha_h, beta_m, beta_n, beta_h])
+
+class RateTable(object):
+    """
+    HH rate functions tabulated on a voltage grid and evaluated by linear
+    interpolation, as a cheaper alternative to the six exponentials of
+    HodgekinHuxley. Assign one to HhLayer.rateTable to use it in a layer; a
+    table can be shared by any number of layers.
+
+    Error bound: linear interpolation of f on a grid of step dv is off by at
+    most dv^2/8 * max|f''|. Every rate is a combination of exponentials in
+    v with length scales of 10 mV or more, so |f''| <= |f|/100 and the
+    relative error of every rate is below dv^2/800 (dv in mV): 3e-6 for the
+    default dv = 0.05, 1.25e-5 for dv = 0.1. The table measures its own
+    worst case at the midpoints of the grid, see maxRelativeError.
+
+    Potentials outside [vmin, vmax] are clamped to the ends of the table.
+    The singular points of alpha_m and alpha_n are tabulated by their
+    limits, see HodgekinHuxleyRates.
+    """
+
+    def __init__(self, vmin=-100.0, vmax=150.0, dv=0.05):
+        """
+        Tabulates the rate functions.
+
+            :param vmin: Lowest potential of the table (mV)
+            :param vmax: Highest potential of the table (mV)
+            :param dv: Step of the voltage grid (mV)
+        """
+        self.vmin = vmin
+        self.dv = dv
+        self.size = int(np.ceil((vmax - vmin) / dv)) + 1
+        self.vmax = vmin + (self.size - 1) * dv
+
+        v = vmin + dv * np.arange(self.size)
+        rates = HodgekinHuxleyRates(v)
+
+        # Stored as [alpha; alpha + beta] for m, n and h, the two quantities
+        # HodgekinHuxleyInPlace needs, one column per grid point, with the
+        # slopes to the next grid point alongside
+        self.value = np.vstack([rates[:3], rates[:3] + rates[3:]])
+        self.slope = np.hstack([np.diff(self.value, axis=1), np.zeros([6, 1])])
+
+        # Copies of value and slope in other dtypes, made when first needed
+        self.tables = {np.dtype(float): (self.value, self.slope)}
+
+        mid = v[:-1] + dv / 2
+        exact = HodgekinHuxleyRates(mid)
+        exact = np.vstack([exact[:3], exact[:3] + exact[3:]])
+        self.maxRelativeError = np.max(np.abs(self.Evaluate(mid) - exact) /
+                                       np.abs(exact))
+
+    def Evaluate(self, v, out=None, work=None):
+        """
+        Interpolates the rates at the given potentials
+
+            :param v: Membrane potentials
+            :type v: np.array (N,)
+            :param out: Optional array the rates are written into, whose
+                        dtype the interpolation is done in
+            :type out: np.array (6, N)
+            :param work: Optional scratch space of the same dtype as out
+            :type work: np.array (7, N)
+            :return: [alpha_m; alpha_n; alpha_h; (alpha + beta)_m;
+                      (alpha + beta)_n; (alpha + beta)_h]
+            :rtype: np.array (6, N)
+        """
+        if out is None:
+            out = np.empty([6, len(v)])
+        if work is None:
+            work = np.empty([7, len(v)])
+        u, buf = work[0], work[1:]
+
+        if out.dtype not in self.tables:
+            self.tables[out.dtype] = (self.value.astype(out.dtype),
+                                      self.slope.astype(out.dtype))
+        value, slope = self.tables[out.dtype]
+
+        # Position on the grid, split into index and fraction
+        np.subtract(v, self.vmin, out=u)
+        u /= self.dv
+        np.maximum(u, 0, out=u)
+        np.minimum(u, self.size - 1, out=u)
+        i = u.astype(np.intp)
+        np.subtract(u, i, out=u, dtype=u.dtype)
+
+        np.take(slope, i, axis=1, out=out)
+        out *= u
+        np.take(value, i, axis=1, out=buf)
+        out += buf
+
+        return out
+
+def GatingRates(v, scratch, table=None):
+    """
+    Computes the gating rates alpha and alpha + beta of m, n and h in place,
+    in rows 12 to 17 of scratch, using rows 0 to 11 as work space.
+
+        :param v: Membrane potentials
+        :type v: np.array (N,)
+        :param scratch: Work space from HodgekinHuxleyWorkspace
+        :type scratch: np.array (20, N)
+        :param table: Rate functions to interpolate instead of computing them
+        :type table: RateTable or None
+        :return: Views of [alpha_m; alpha_n; alpha_h] and
+                 [(alpha + beta)_m; ...]
+        :rtype: tuple of two np.array (3, N)
+    """
+    arg, E = scratch[0:6], scratch[6:12]
+    alpha, beta = scratch[12:15], scratch[15:18]
+
+    if table is None:
+        # The constants are cast to the dtype of scratch, so that float32
+        # layers are not computed in float64
+        np.multiply(RATE_SLOPE, v, out=arg, dtype=arg.dtype)
+        np.add(arg, RATE_OFFSET, out=arg, dtype=arg.dtype)
+        np.exp(arg, out=E)
+
+        # alpha_m = arg_m / (E_m - 1), alpha_n = 0.1 * arg_n / (E_n - 1),
+        # alpha_h = 0.07 * E_h. Next to the removable singularities at
+        # arg = 0, where E rounds to 1, the quotient is replaced by its
+        # limit 1. Rare in float64, this happens regularly in float32.
+        np.subtract(E[:2], 1.0, out=alpha[:2])
+        regular = alpha[:2] != 0
+        np.divide(arg[:2], alpha[:2], out=alpha[:2], where=regular)
+        np.copyto(alpha[:2], 1.0, where=~regular)
+        alpha[1] *= 0.1
+        np.multiply(0.07, E[2], out=alpha[2])
+
+        # beta_m = 4 * E_m, beta_n = 0.125 * E_n, beta_h = 1 / (E_h + 1)
+        np.multiply(BETA_SCALE, E[3:5], out=beta[:2], dtype=beta.dtype)
+        np.add(E[5], 1.0, out=beta[2])
+        np.divide(1.0, beta[2], out=beta[2])
+        beta += alpha
+    else:
+        # The table holds alpha and alpha + beta directly
+        table.Evaluate(v, out=scratch[12:18], work=scratch[0:7])
+
+    return alpha, beta
+
+def HodgekinHuxleyInPlace(x, param, out, scratch, table=None):
+
+    """
+    Computes the differential of the HH states like HodgekinHuxley, but
+    writes it into a preallocated array instead of allocating a new one.
+    The six rate exponentials and the three gating variables are each
+    handled as one block, so that a call takes about half as many numpy
+    operations. Results agree with HodgekinHuxley up to rounding, or up to
+    the error bound of the table if one is given.
+
+        :param x: Current state [v(t); m(t); n(t); h(t)]
+        :type x: np.array (4, N)
+        :param param: Hodgkin-Huxley model parameters
+                      [I(t), gNa, gK, gL, ENa, EK, EL, C]
+        :type param: np.array (8, N)
+        :param out: Array the differential [v_dt; m_dt; n_dt; h_dt] is
+                    written into
+        :type out: np.array (4, N)
+        :param scratch: Work space from HodgekinHuxleyWorkspace
+        :type scratch: np.array (20, N)
+        :param table: Rate functions to interpolate instead of computing them
+        :type table: RateTable or None
+    """
+    v, m, n, h = x
+    I, gNa, gK, gL, ENa, EK, EL, C = param
+    gates, vdot = x[1:], out[0]
+    a, b = scratch[18], scratch[19]
+
+    alpha, beta = GatingRates(v, scratch, table)
+
+    # [m, n, h]_dt = alpha * (1 - gate) - beta * gate
+    #              = alpha - (alpha + beta) * gate
+    beta *= gates
+    np.subtract(alpha, beta, out=out[1:])
+
+    # v_dt = (I - sigmaIk) / C
+    np.power(m, 3, out=a)
+    a *= h
+    a *= gNa
+    np.subtract(v, ENa, out=b)
+    a *= b
+    np.power(n, 4, out=b)
+    b *= gK
+    np.subtract(v, EK, out=vdot)
+    b *= vdot
+    a += b
+    np.subtract(v, EL, out=b)
+    b *= gL
+    a += b
+    np.subtract(I, a, out=vdot)
+    vdot /= C
+
+    return out
+
+def HodgekinHuxleyLinear(x, param, a, b, scratch, table=None):
+
+    """
+    Writes the HH equations in the form dx/dt = a - b * x, where a and b
+    depend on the other state variables but not on x itself. For the gates
+    a = alpha and b = alpha + beta, which depend on v only. For v,
+    b = (gNa m^3 h + gK n^4 + gL) / C is the total conductance and
+    a = (I + gNa m^3 h ENa + gK n^4 EK + gL EL) / C. This is the form
+    SimulationMethods.rush_larsen integrates.
+
+        :param x: Current state [v(t); m(t); n(t); h(t)]
+        :type x: np.array (4, N)
+        :param param: Hodgkin-Huxley model parameters
+                      [I(t), gNa, gK, gL, ENa, EK, EL, C]
+        :type param: np.array (8, N)
+        :param a: Array the constant terms are written into
+        :type a: np.array (4, N)
+        :param b: Array the decay rates are written into
+        :type b: np.array (4, N)
+        :param scratch: Work space from HodgekinHuxleyWorkspace
+        :type scratch: np.array (20, N)
+        :param table: Rate functions to interpolate instead of computing them
+        :type table: RateTable or None
+    """
+    v, m, n, h = x
+    I, gNa, gK, gL, ENa, EK, EL, C = param
+    g, e = scratch[18], scratch[19]
+
+    alpha, beta = GatingRates(v, scratch, table)
+    a[1:] = alpha
+    b[1:] = beta
+
+    # Sodium, potassium and leak conductances
+    np.power(m, 3, out=g)
+    g *= h
+    g *= gNa
+    np.multiply(g, ENa, out=a[0])
+    np.copyto(b[0], g)
+    np.power(n, 4, out=g)
+    g *= gK
+    np.multiply(g, EK, out=e)
+    a[0] += e
+    b[0] += g
+    np.multiply(gL, EL, out=e)
+    a[0] += e
+    b[0] += gL
+
+    a[0] += I
+    a[0] /= C
+    b[0] /= C
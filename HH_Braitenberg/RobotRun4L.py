@@ -26,7 +26,10 @@ Nm = 2  # Motor neurons. Try 1, 4, and 8
 Ni = 2
 net  = RobotConnect4L(Ns, Nm, Ni)
 
-Dmax = 5      # Maximum synaptic delay
+# Integrate the HH neurons with second order exponential Euler at 0.05 ms
+# steps, several times faster than RK4, which is unstable beyond 0.02 ms
+net.SetIntegrator('rush-larsen2', 0.05)
+
 Ib   = 30     # Base current
 Rmax = 40     # Estimated peak motor firing rate in Hz
 Umin = 0.025  # Minimum wheel velocity in cm/ms
@@ -45,10 +48,22 @@ for lr in xrange(net.Nlayers):
   net.layer[lr].h = h0 * np.ones(net.layer[lr].N)
   net.layer[lr].firings = np.array([])
 
+# Update the six small layers together, see HhNetwork.Flatten
+net.Flatten()
+
 # Simulation parameters
 Tmax = 10000  # Simulation time in milliseconds
 dt   = 1000    # Robot step size in milliseconds
 
+# Only keep the spikes of the current robot step in the firings of the
+# layers, timed 0 to dt-1 within the step. The older ones are dropped.
+net.RetainSpikes(dt)
+
+# Count the spikes of the motor neurons as the network runs, over the last
+# robot step
+motorL = net.MonitorRate(2, dt)
+motorR = net.MonitorRate(3, dt)
+
 # Initialise record of membrane potentials
 v = {}
 I={}
@@ -94,17 +109,6 @@ for t in xrange(len(T)):
   # SL, SR = RobotGetSensors(Env, x[t], y[t], w[t], xmax, ymax)
   SL, SR = Env.GetSensors(x[t], y[t], w[t])
 
-  # Carry over firings that might not have reached their targets yet
-  for lr in xrange(L):
-    firings = []
-    for f in net.layer[lr].firings:
-      # discard all earlier firings
-      if f[0] > dt-Dmax:
-        # also decrease the time so that it is in -Dmax to -1
-        f[0] = f[0] - dt
-        firings.append(f)
-    net.layer[lr].firings = np.array(firings)
-
   for t2 in xrange(dt):
     # Deliver stimulus as a Poisson spike stream
     net.layer[0].I = rn.poisson(SL*15, N0)
@@ -127,14 +131,6 @@ for t in xrange(len(T)):
       v[lr][t2, :] = net.layer[lr].v
      # I[lr][t2, :] = net.layer[lr].I
 
-  # Discard carried over firings with time less than 0
-  for lr in xrange(L):
-    firings = []
-    for f in net.layer[lr].firings:
-      if f[0] > 0:
-        firings.append(f)
-    net.layer[lr].firings = np.array(firings)
-
   # Add Dirac pluses (mainly for presentation)
   for lr in xrange(L):
     firings = net.layer[lr].firings
@@ -143,8 +139,8 @@ for t in xrange(len(T)):
 
   # Output to motors
   # Calculate motor firing rates in Hz
-  RL = 1.0*len(net.layer[2].firings)/dt/N2*1000
-  RR = 1.0*len(net.layer[3].firings)/dt/N3*1000
+  RL = motorL.Rate()
+  RR = motorR.Rate()
 
   # Set wheel velocities (as fractions of Umax)
   UL = (Umin/Umax + RL/Rmax*(1 - Umin/Umax))
@@ -3,6 +3,8 @@ Simulation Methods
 
 """
 
+import numpy as np
+
 def rk4(x_prev, dt, param, diff):
     """
     Implements Runge-Kutta 4 Method to progress the next state vector
@@ -26,6 +28,289 @@ def rk4(x_prev, dt, param, diff):
 
     return x_prev + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
 
+def rk4_workspace(x):
+    """
+    Allocates the stage buffers used by rk4_inplace, of the same dtype as x
+
+    :param x: State vector the buffers are for
+    :type x: np.array
+    :return: Buffers for k1, k2, k3, k4 and the intermediate state
+    :rtype: np.array with one more leading dimension than x
+    """
+    return np.zeros((5,) + np.shape(x), dtype=np.asarray(x).dtype)
+
+def rk4_inplace(x, dt, param, diff, work):
+    """
+    Implements Runge-Kutta 4 Method like rk4, but advances the state vector
+    in place, using the preallocated stage buffers in work instead of
+    allocating new arrays. Gives the same results as rk4.
+
+    :param x: State vector, overwritten with the next state
+    :type x: np.array
+    :param dt: Time step
+    :type dt: double
+    :param param: Differential Equation Parameters
+    :type param: np.array
+    :param diff: Function that writes the derivative of the state vector
+    :type diff: Function taking state x, param and the output array
+    :param work: Stage buffers from rk4_workspace
+    :type work: np.array
+    """
+
+    k1, k2, k3, k4, xs = work
+
+    diff(x, param, k1)
+    np.multiply(0.5 * dt, k1, out=xs)
+    xs += x
+    diff(xs, param, k2)
+    np.multiply(0.5 * dt, k2, out=xs)
+    xs += x
+    diff(xs, param, k3)
+    np.multiply(dt, k3, out=xs)
+    xs += x
+    diff(xs, param, k4)
+
+    # x += dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+    k2 *= 2
+    k2 += k1
+    k3 *= 2
+    k2 += k3
+    k2 += k4
+    k2 *= dt / 6
+    x += k2
+
+def rush_larsen_workspace(x):
+    """
+    Allocates the buffers used by rush_larsen and rush_larsen2, of the same
+    dtype as x
+
+    :param x: State vector the buffers are for
+    :type x: np.array
+    :return: Buffers for the coefficients a and b and an intermediate state
+    :rtype: np.array with one more leading dimension than x
+    """
+    return np.zeros((3,) + np.shape(x), dtype=np.asarray(x).dtype)
+
+def relax(x, a, b, dt, out):
+    """
+    Advances dx/dt = a - b * x exactly by dt for fixed a and b, i.e.
+    out = a / b + (x - a / b) * exp(-b * dt). Overwrites a and b.
+    """
+    a /= b
+    b *= -dt
+    np.exp(b, out=b)
+
+    np.subtract(x, a, out=out)
+    out *= b
+    out += a
+
+def rush_larsen(x, dt, param, linear, work):
+    """
+    Implements the exponential Euler (Rush-Larsen) Method, advancing the
+    state vector in place. Every variable is taken to follow
+    dx/dt = a - b * x, with a and b frozen at their values at the start of
+    the step, so it relaxes exactly towards a / b:
+
+        x <- a / b + (x - a / b) * exp(-b * dt)
+
+    For HH gating variables a and b only depend on v, so the gates are
+    integrated exactly for a frozen voltage. Unlike RK4 the step is stable
+    for any dt when b > 0, but it is only first order accurate.
+
+    :param x: State vector, overwritten with the next state
+    :type x: np.array
+    :param dt: Time step
+    :type dt: double
+    :param param: Differential Equation Parameters
+    :type param: np.array
+    :param linear: Function that writes the coefficients a and b (b > 0)
+    :type linear: Function taking state x, param and the arrays a and b
+    :param work: Buffers from rush_larsen_workspace
+    :type work: np.array
+    """
+
+    a, b = work[0], work[1]
+
+    linear(x, param, a, b)
+    relax(x, a, b, dt, x)
+
+def rush_larsen2(x, dt, param, linear, work):
+    """
+    Second order variant of rush_larsen (exponential midpoint): a half step
+    of rush_larsen estimates the state at the middle of the step, and the
+    full step relaxes x with the coefficients a and b taken there. Just as
+    stable, for twice the work per step.
+
+    Parameters as in rush_larsen.
+    """
+
+    a, b, xh = work
+
+    linear(x, param, a, b)
+    relax(x, a, b, 0.5 * dt, xh)
+
+    linear(xh, param, a, b)
+    relax(x, a, b, dt, x)
+
+# Dormand-Prince 5(4) tableau: nodes, stage coefficients, weights of the
+# 5th order solution minus those of the embedded 4th order one, and the
+# coefficients of the 4th order continuous extension (dense output)
+DOPRI_C = np.array([0, 1 / 5.0, 3 / 10.0, 4 / 5.0, 8 / 9.0, 1, 1])
+DOPRI_A = [[],
+           [1 / 5.0],
+           [3 / 40.0, 9 / 40.0],
+           [44 / 45.0, -56 / 15.0, 32 / 9.0],
+           [19372 / 6561.0, -25360 / 2187.0, 64448 / 6561.0, -212 / 729.0],
+           [9017 / 3168.0, -355 / 33.0, 46732 / 5247.0, 49 / 176.0,
+            -5103 / 18656.0],
+           [35 / 384.0, 0, 500 / 1113.0, 125 / 192.0, -2187 / 6784.0,
+            11 / 84.0]]
+DOPRI_E = np.array([71 / 57600.0, 0, -71 / 16695.0, 71 / 1920.0,
+                    -17253 / 339200.0, 22 / 525.0, -1 / 40.0])
+DOPRI_P = np.array([
+    [1, -8048581381 / 2820520608.0, 8663915743 / 2820520608.0,
+     -12715105075 / 11282082432.0],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799.0, -68118460800 / 10900136933.0,
+     87487479700 / 32700410799.0],
+    [0, -1754552775 / 470086768.0, 14199869525 / 1410260304.0,
+     -10690763975 / 1880347072.0],
+    [0, 127303824393 / 49829197408.0, -318862633887 / 49829197408.0,
+     701980252875 / 199316789632.0],
+    [0, -282668133 / 205662961.0, 2019193451 / 616988883.0,
+     -1453857185 / 822651844.0],
+    [0, 40617522 / 29380423.0, -110615467 / 29380423.0,
+     69997945 / 29380423.0]])
+
+def dopri5_workspace(x):
+    """
+    Allocates the stage buffers used by dopri5, of the same dtype as x
+
+    :param x: State vector the buffers are for
+    :type x: np.array
+    :return: Buffers for the seven stages and the trial state
+    :rtype: np.array with one more leading dimension than x
+    """
+    return np.zeros((8,) + np.shape(x), dtype=np.asarray(x).dtype)
+
+def dopri5(x, t, t_end, param, diff, work, h, rtol=1e-5, atol=1e-5,
+           event=None):
+    """
+    Implements the adaptive Dormand-Prince 5(4) Method, advancing the state
+    vector in place from time t to t_end. All the elements of x share one
+    step size, which is chosen so that the error estimate of every element
+    stays below atol + rtol * |x|: large steps are taken while nothing
+    happens and small ones during fast transients such as action
+    potentials.
+
+    Upward crossings of a threshold by one row of x (e.g. v through the
+    spike threshold) are located within the step they happen in, using
+    the method's 4th order dense output and bisection.
+
+    :param x: State vector, overwritten with the state at t_end
+    :type x: np.array (rows, N)
+    :param t: Start time
+    :type t: double
+    :param t_end: End time
+    :type t_end: double
+    :param param: Differential Equation Parameters
+    :type param: np.array
+    :param diff: Function that writes the derivative of the state vector
+    :type diff: Function taking state x, param and the output array
+    :param work: Stage buffers from dopri5_workspace
+    :type work: np.array
+    :param h: Initial step size, usually the one returned by the last call
+    :type h: double
+    :param rtol: Relative error tolerance
+    :param atol: Absolute error tolerance
+    :param event: (row, threshold) to locate upward crossings of, or None
+    :type event: tuple
+    :return: Step size to start the next call with, the crossings as
+             (column indices, times) arrays sorted by time, and the number of
+             evaluations of diff
+    :rtype: tuple
+    """
+
+    k, y = work[:7], work[7]
+    evaluations = 1
+    crossings = []
+
+    diff(x, param, k[0])
+
+    while t < t_end:
+        step = min(h, t_end - t)
+
+        for s in xrange(1, 7):
+            np.copyto(y, x)
+            y += step * np.tensordot(DOPRI_A[s], k[:s], axes=1)
+            diff(y, param, k[s])
+        evaluations += 6
+
+        # y is the 5th order solution; compare it with the 4th order one
+        error = step * np.tensordot(DOPRI_E, k, axes=1)
+        scale = atol + rtol * np.maximum(np.abs(x), np.abs(y))
+        norm = np.max(np.abs(error) / scale)
+
+        if norm <= 1:
+            if event is not None:
+                row, threshold = event
+                idx = np.where((x[row] < threshold) & (y[row] >= threshold))[0]
+                if len(idx) > 0:
+                    theta = locate_crossing(x[row, idx], k[:, row, idx], step,
+                                            threshold)
+                    crossings.append((idx, t + theta * step))
+
+            x[...] = y
+            k[0] = k[6]
+            t += step
+
+        # Standard step size control, within a factor of 0.2 to 5
+        if norm == 0:
+            factor = 5.0
+        else:
+            factor = min(5.0, max(0.2, 0.9 * norm ** -0.2))
+        h = step * factor
+
+    if crossings:
+        idx, times = [np.concatenate(c) for c in zip(*crossings)]
+        order = np.argsort(times, kind='mergesort')
+        crossings = (idx[order], times[order])
+    else:
+        crossings = (np.zeros(0, dtype=int), np.zeros(0))
+
+    return h, crossings, evaluations
+
+def locate_crossing(x0, k, h, threshold, iterations=40):
+    """
+    Locates where the dense output of a Dormand-Prince step crosses a
+    threshold, by bisection
+
+    :param x0: Values at the start of the step, below threshold
+    :type x0: np.array (M,)
+    :param k: Stages of the step for these values
+    :type k: np.array (7, M)
+    :param h: Step size
+    :type h: double
+    :param threshold: Threshold, reached by the end of the step
+    :type threshold: double
+    :return: Fraction of the step at which each value crosses
+    :rtype: np.array (M,)
+    """
+
+    # Dense output x0 + h * (Q[0] s + Q[1] s^2 + Q[2] s^3 + Q[3] s^4)
+    Q = h * np.dot(DOPRI_P.T, k)
+    lo = np.zeros(len(x0))
+    hi = np.ones(len(x0))
+
+    for i in xrange(iterations):
+        s = 0.5 * (lo + hi)
+        value = x0 + s * (Q[0] + s * (Q[1] + s * (Q[2] + s * Q[3])))
+        below = value < threshold
+        lo = np.where(below, s, lo)
+        hi = np.where(below, hi, s)
+
+    return 0.5 * (lo + hi)
+
 def eul(x_prev, dt, param, diff):
 
     """